@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+
+"""Memory per excited state, with and without __slots__.
+
+Builds the same synthetic states once with the slotted ExcitedState and
+MOTransition classes and once with plain classes that carry a per-instance
+__dict__, like the classes did before, and reports the bytes per state
+(transitions included) measured with tracemalloc.
+
+    python benchmarks/bench_memory.py [--states N] [--trans M]
+"""
+
+import argparse
+import gc
+import random
+import tracemalloc
+
+from td.ExcitedState import ExcitedState
+
+
+class DictMOTransition:
+    def __init__(self, start_mo, to_or_from, final_mo, ci_coeff,
+                 contrib, start_spin, final_spin,
+                 start_irrep, final_irrep):
+        self.start_mo = int(start_mo)
+        self.to_or_from = to_or_from
+        self.final_mo = int(final_mo)
+        self.ci_coeff = float(ci_coeff)
+
+        self.contrib = float(contrib)
+        self.start_spin = start_spin
+        self.final_spin = final_spin
+        self.start_irrep = start_irrep
+        self.final_irrep = final_irrep
+
+
+class DictExcitedState:
+    def __init__(self, id, spin, spat, dE, l, f, s2):
+        self.id = int(id)
+        self.id_sorted = self.id
+        self.spin = spin
+        self.spat = spat
+        self.dE = dE
+        self.l = l
+        self.f = f
+        self.s2 = s2
+        self.rr_weight = None
+
+        self.mo_transitions = list()
+        self.irrep = self.spat
+
+    def add_mo_transition(self, start_mo, to_or_from, final_mo, ci_coeff,
+                          start_spin="α", final_spin="α",
+                          contrib=0.0,
+                          start_irrep="a", final_irrep="a"):
+        start_spin = "α" if (start_spin == "a") else "β"
+        final_spin = "α" if (final_spin == "a") else "β"
+
+        self.mo_transitions.append(DictMOTransition(
+            start_mo, to_or_from, final_mo, ci_coeff,
+            contrib, start_spin, final_spin, start_irrep, final_irrep)
+        )
+
+
+def make_rows(states, trans, seed=0):
+    # The strings are built from parts, as they would be when parsed from
+    # a log, so they are not shared constants.
+    rnd = random.Random(seed)
+    rows = list()
+    for i in range(states):
+        dE = rnd.uniform(1, 8)
+        state = (str(i+1), "Singlet", "-".join(("A", "")).strip("-"),
+                 dE, 1239.84 / dE, rnd.uniform(0, 1), 0.0)
+        transitions = [(rnd.randint(1, 60), "->", rnd.randint(61, 120),
+                        rnd.uniform(-1, 1), "a", "a")
+                       for _ in range(trans)]
+        rows.append((state, transitions))
+    return rows
+
+
+def measure(cls, rows):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    states = list()
+    for state, transitions in rows:
+        exc_state = cls(*state)
+        for mo_trans in transitions:
+            exc_state.add_mo_transition(*mo_trans)
+        states.append(exc_state)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / len(rows)
+
+
+def run():
+    parser = argparse.ArgumentParser(
+        description="Memory per excited state, with and without __slots__."
+    )
+    parser.add_argument("--states", type=int, default=5000)
+    parser.add_argument("--trans", type=int, default=5,
+                        help="MO transitions per state.")
+    args = parser.parse_args()
+
+    rows = make_rows(args.states, args.trans)
+    plain = measure(DictExcitedState, rows)
+    slotted = measure(ExcitedState, rows)
+    print("{} states, {} transitions each".format(args.states, args.trans))
+    print("{:<10}{:>10.0f} bytes/state".format("__dict__", plain))
+    print("{:<10}{:>10.0f} bytes/state".format("__slots__", slotted))
+    print("{:<10}{:>10.1%}".format("saved", 1 - slotted / plain))
+
+
+if __name__ == "__main__":
+    run()
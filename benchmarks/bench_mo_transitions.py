@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+
+"""Post-processing of the MO transitions of excited states.
+
+Compares ExcitedState.process_mo_transitions() with the quadratic
+calculate_contributions(), correct_backexcitations(),
+suppress_low_ci_coeffs() and update_irreps() sequence it replaced, on
+synthetic states with many CI contributions and back-excitations. The
+reference sequence and the states are taken from
+tests/test_mo_transitions.py, which also checks that both yield the same
+transitions.
+
+    python benchmarks/bench_mo_transitions.py [--states N] [--trans M ...]
+"""
+
+import argparse
+from pathlib import Path
+import sys
+import time
+
+# Share the reference implementation and the states with the tests
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from tests.test_mo_transitions import (CI_COEFF_THRESH, loop_process,
+                                       make_states)
+
+# MOs on either side of the transitions, enough for 500 per state
+MOS = 100
+
+
+def timed(process, states, trans):
+    excited_states = make_states(states, trans, mos=MOS)
+    start = time.perf_counter()
+    for es in excited_states:
+        process(es, CI_COEFF_THRESH)
+    return time.perf_counter() - start
+
+
+def new_process(es, thresh):
+    es.process_mo_transitions(thresh)
+
+
+def run():
+    parser = argparse.ArgumentParser(
+        description="Post-processing of MO transitions, old vs. fused pass."
+    )
+    parser.add_argument("--states", type=int, default=50)
+    parser.add_argument("--trans", type=int, nargs="+",
+                        default=(10, 100, 500),
+                        help="MO transitions per state.")
+    args = parser.parse_args()
+
+    print("{} states".format(args.states))
+    print("{:>12}{:>10}{:>10}{:>8}".format("trans/state", "old / s",
+                                           "new / s", "speedup"))
+    for trans in args.trans:
+        old_time = timed(loop_process, args.states, trans)
+        new_time = timed(new_process, args.states, trans)
+        print("{:>12}{:>10.4f}{:>10.4f}{:>8.1f}".format(
+              trans, old_time, new_time, old_time / new_time))
+
+
+if __name__ == "__main__":
+    run()
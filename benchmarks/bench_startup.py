@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+
+"""Startup time of td, checked against a budget.
+
+Times 'import td.main' and 'td --help' in fresh interpreters, along with
+a bare interpreter and 'import numpy' for reference, and reports the best
+of several runs. Exits with status 1 if importing td.main or printing the
+help takes longer than the budget.
+
+    python benchmarks/bench_startup.py [--repeat N] [--budget SECONDS]
+"""
+
+import argparse
+import subprocess
+import sys
+import time
+
+# Budget in s for 'import td.main' and 'td --help', including the start of
+# the interpreter. Importing td.main took about 1.3 s while matplotlib,
+# pandas & co. were imported eagerly and about 0.15 s without them.
+BUDGET = 0.5
+
+SNIPPETS = (
+    ("python", "pass"),
+    ("import numpy", "import numpy"),
+    ("import td.main", "import td.main"),
+    ("td --help", "import sys; sys.argv = ['td', '--help']; "
+                  "from td.main import run; run()"),
+)
+# Snippets that have to finish within the budget
+CHECKED = ("import td.main", "td --help")
+
+
+def best_time(code, repeat):
+    times = list()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], check=True,
+                       stdout=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def run():
+    parser = argparse.ArgumentParser(
+        description="Startup time of td, checked against a budget."
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=BUDGET,
+                        help="Budget in s for 'import td.main' and "
+                             "'td --help'.")
+    args = parser.parse_args()
+
+    over_budget = list()
+    print("best of {} runs, budget {:.2f} s".format(args.repeat, args.budget))
+    for name, code in SNIPPETS:
+        elapsed = best_time(code, args.repeat)
+        status = ""
+        if name in CHECKED:
+            status = "  ok"
+            if elapsed > args.budget:
+                status = "  over budget!"
+                over_budget.append(name)
+        print("{:<16}{:>8.3f} s{}".format(name, elapsed, status))
+    if over_budget:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    run()
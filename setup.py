@@ -1,18 +1,26 @@
 #!/usr/bin/env python3
 
+import os
+import re
 from setuptools import find_packages, setup
 import sys
 
 if sys.version_info.major < 3:
     raise SystemExit("Python 3 is required!")
 
+# The version is only defined in td/__init__.py, which is also used for the
+# keys of the cache of parsed logs.
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "td",
+                       "__init__.py")) as handle:
+    version = re.search("__version__ = \"(.+?)\"", handle.read()).group(1)
+
 package_data = {
     "td": ["templates/*.plt",],
 }
 
 setup(
     name="td",
-    version="0.2.1",
+    version=version,
     description="Parser for excited state calculations",
     url="https://github.com/eljost/td",
     maintainer="Johannes Steinmetzer",
@@ -30,7 +38,6 @@ setup(
         "python-docx",
         "scipy",
         "simplejson",
-        "pyparsing",
     ],
     entry_points={
         "console_scripts": [
@@ -1,31 +1,64 @@
 #!/usr/bin/env python3
 
+import functools
 import logging
 import math
 import re
+import sys
 
 from td.helper_funcs import IRREPS_REPL
 from td.MOTransition import MOTransition
 
+
+@functools.lru_cache(maxsize=None)
+def normalize_irrep(irrep):
+    for key in IRREPS_REPL:
+        irrep = re.sub(key, IRREPS_REPL[key], irrep)
+    return sys.intern(irrep)
+
+
 class ExcitedState:
-    def __init__(self, id, spin, spat, dE, l, f, s2):
+
+    __slots__ = (
+        "id",
+        "id_sorted",
+        "spin",
+        "spat",
+        "dE",
+        "l",
+        "f",
+        "s2",
+        "mult",
+        "rr_weight",
+        "mo_transitions",
+        "irrep",
+        "irreps",
+        "mo_trans_per_irrep",
+    )
+
+    def __init__(self, id, spin, spat, dE, l, f, s2, mult=None):
         self.id = int(id)
         self.id_sorted = self.id
-        self.spin = spin
-        self.spat = spat
+        # Spin and irrep labels are shared by many states, so they are
+        # interned to store every label only once.
+        self.spin = sys.intern(spin)
+        self.spat = sys.intern(spat)
         self.dE = dE  # in eV
         self.l = l  # in nm
         self.f = f
         self.s2 = s2
+        self.mult = mult
         self.rr_weight = None
 
         self.mo_transitions = list()
         self.irrep = self.spat
         self.normalize_irrep()
+        # Set by process_mo_transitions()
+        self.irreps = None
+        self.mo_trans_per_irrep = None
 
     def normalize_irrep(self):
-        for key in IRREPS_REPL:
-            self.irrep = re.sub(key, IRREPS_REPL[key], self.irrep)
+        self.irrep = normalize_irrep(self.irrep)
 
     def as_list(self, attrs=None):
         if not attrs:
@@ -67,33 +100,63 @@ class ExcitedState:
     def is_singlet(self):
         return self.mult == 1
 
-    def calculate_contributions(self):
+    def process_mo_transitions(self, ci_coeff_thresh):
+        """Calculate the contributions, correct them for back-excitations,
+        drop transitions below the CI coefficient threshold and find out
+        which irreps are important for the MOTransitions.
+
+        Done in two linear passes over the transitions."""
+        is_singlet = self.is_singlet()
+        excitations = dict()
+        back_transitions = list()
         for mo_trans in self.mo_transitions:
-            if (mo_trans.contrib is not None and
-                not math.isclose(mo_trans.contrib, 0.0)):
-                continue
-            contrib = mo_trans.ci_coeff**2
-            if self.is_singlet():
-                contrib *= 2
-            mo_trans.contrib = contrib
-
-    def correct_backexcitations(self):
-        # Check if there are any back-excitations, e.g.
-        # 89B <- 90B
-        back_transitions = [bt for bt in self.mo_transitions
-                            if bt.to_or_from == "<-"]
+            if (mo_trans.contrib is None or
+                math.isclose(mo_trans.contrib, 0.0)):
+                contrib = mo_trans.ci_coeff**2
+                if is_singlet:
+                    contrib *= 2
+                mo_trans.contrib = contrib
+            # Excitations are keyed by (start_mo, final_mo), so the
+            # transition corresponding to a back-excitation, e.g.
+            # 89B <- 90B, is found in constant time.
+            key = (mo_trans.start_mo, mo_trans.final_mo)
+            if mo_trans.to_or_from == "->":
+                excitations.setdefault(key, list()).append(mo_trans)
+            elif mo_trans.to_or_from == "<-":
+                back_transitions.append(mo_trans)
         for bt in back_transitions:
-            # Find corresponding transition from final_mo -> start_mo
-            trans_to_correct = [t for t in self.mo_transitions
-                                if (t.start_mo == bt.start_mo and
-                                    t.final_mo == bt.final_mo and
-                                    t.to_or_from == "->")]
+            trans_to_correct = excitations.get((bt.start_mo, bt.final_mo))
             if trans_to_correct:
                 assert(len(trans_to_correct) == 1)
-                trans_to_correct = trans_to_correct[0]
-                # Correct contribution of trans_to_correct
-
-                trans_to_correct.contrib -= bt.contrib
+                trans_to_correct[0].contrib -= bt.contrib
+
+        # Drop transitions below the CI coefficient threshold
+        contrib_thresh = ci_coeff_thresh**2 * 2
+        kept = list()
+        start_irreps = list()
+        final_irreps = list()
+        start_mos = dict()
+        final_mos = dict()
+        for mo_trans in self.mo_transitions:
+            if mo_trans.contrib:
+                if mo_trans.contrib <= contrib_thresh:
+                    continue
+            elif abs(mo_trans.ci_coeff) <= ci_coeff_thresh:
+                continue
+            kept.append(mo_trans)
+            start_irreps.append(mo_trans.start_irrep)
+            final_irreps.append(mo_trans.final_irrep)
+            start_mos.setdefault(mo_trans.start_irrep,
+                                 list()).append(mo_trans.start_mo)
+            final_mos.setdefault(mo_trans.final_irrep,
+                                 list()).append(mo_trans.final_mo)
+        self.mo_transitions[:] = kept
+        self.irreps = set(start_irreps + final_irreps)
+        self.mo_trans_per_irrep = dict()
+        for irrep in self.irreps:
+            unique_mos = set(start_mos.get(irrep, list())
+                             + final_mos.get(irrep, list()))
+            self.mo_trans_per_irrep[irrep] = unique_mos
 
     def print_mo_transitions(self, verbose_mos):
         for mot in self.mo_transitions:
@@ -114,44 +177,12 @@ class ExcitedState:
                     logging.warning("Verbose MO name for {} {}"
                                     " missing!".format(*err.args[0]))
 
-    def suppress_low_ci_coeffs(self, thresh):
-        # Check if excitation lies below ci coefficient threshold
-        # if it does don't add this excitation
-        contrib_thresh = thresh**2 * 2
-        to_del = list()
-        for mo_trans in self.mo_transitions:
-            if mo_trans.contrib:
-                if mo_trans.contrib <= contrib_thresh:
-                    to_del.append(mo_trans)
-                continue
-            if abs(mo_trans.ci_coeff) <= thresh:
-                to_del.append(mo_trans)
-        for td in to_del:
-            self.mo_transitions.remove(td)
-
     def calc_rr_weight(self, rr_exc):
         l_in_cm = 10**7 / self.l
         rr_ex_in_cm = 10**7 / rr_exc
         G = 1500j
         self.rr_weight = self.f * abs(G/(l_in_cm-rr_ex_in_cm-G))
 
-    def update_irreps(self):
-        """Find out which irreps are important for the MOTransitions."""
-        start_irreps = [mo_trans.start_irrep for mo_trans
-                        in self.mo_transitions]
-        final_irreps = [mo_trans.final_irrep for mo_trans
-                        in self.mo_transitions]
-        self.irreps = set(start_irreps + final_irreps)
-
-        self.mo_trans_per_irrep = dict()
-        for irrep in self.irreps:
-            start_mos = [mot.start_mo for mot in self.mo_transitions
-                         if mot.start_irrep == irrep]
-            final_mos = [mot.final_mo for mot in self.mo_transitions
-                         if mot.final_irrep == irrep]
-            unique_mos = set(start_mos + final_mos)
-            self.mo_trans_per_irrep[irrep] = unique_mos
-
     """
     # find lowest orbital from where an excitation originates
     min_mo = min(itertools.chain(*[exc_state.get_start_mos()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+
+import numpy as np
+
+
+def to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        # e.g. '???' for <S**2> when it isn't available
+        return np.nan
+
+
+def to_codes(values):
+    """Return the unique labels and the code of every value."""
+    if len(values) == 0:
+        return np.array(list(), dtype=str), np.array(list(), dtype=int)
+    return np.unique(values, return_inverse=True)
+
+
+class ExcitedStateTable:
+    """Columnar representation of a list of ExcitedState objects.
+
+    The state data is kept in NumPy arrays, so filtering and sorting can be
+    done with vectorized masks and argsorts. Spin and irrep strings are
+    stored as integer codes into 'spin_labels' and 'spat_labels'. The MO
+    transitions of all states are stored in flat arrays; the transitions
+    of the i-th state are found at trans_offsets[i]:trans_offsets[i+1]
+    (CSR layout).
+
+    Indexing with a boolean mask, an index array or a slice returns a new
+    table. The underlying ExcitedState objects are still available through
+    'excited_states', e.g. for the exporters."""
+
+    columns = ("id", "id_sorted", "dE", "l", "f", "s2", "spin", "spat")
+    transition_columns = ("start_mo", "final_mo", "ci_coeff", "contrib",
+                          "back")
+
+    def __init__(self, states, data, spin_labels, spat_labels,
+                 trans_offsets, trans_data):
+        self.states = states
+        self.data = data
+        self.spin_labels = spin_labels
+        self.spat_labels = spat_labels
+        self.trans_offsets = trans_offsets
+        self.trans_data = trans_data
+
+    @classmethod
+    def from_excited_states(cls, excited_states):
+        excited_states = list(excited_states)
+        states = np.empty(len(excited_states), dtype=object)
+        states[:] = excited_states
+        spin_labels, spin = to_codes([es.spin for es in excited_states])
+        spat_labels, spat = to_codes([es.spat for es in excited_states])
+        data = {
+            "id": np.array([es.id for es in excited_states], dtype=int),
+            "id_sorted": np.array([es.id_sorted for es in excited_states],
+                                  dtype=int),
+            "dE": np.array([es.dE for es in excited_states], dtype=float),
+            "l": np.array([es.l for es in excited_states], dtype=float),
+            "f": np.array([es.f for es in excited_states], dtype=float),
+            "s2": np.array([to_float(es.s2) for es in excited_states],
+                           dtype=float),
+            "spin": spin,
+            "spat": spat,
+        }
+
+        counts = [len(es.mo_transitions) for es in excited_states]
+        trans_offsets = np.zeros(len(excited_states)+1, dtype=int)
+        trans_offsets[1:] = np.cumsum(counts)
+        mo_transitions = [mot for es in excited_states
+                          for mot in es.mo_transitions]
+        trans_data = {
+            "start_mo": np.array([mot.start_mo for mot in mo_transitions],
+                                 dtype=int),
+            "final_mo": np.array([mot.final_mo for mot in mo_transitions],
+                                 dtype=int),
+            "ci_coeff": np.array([mot.ci_coeff for mot in mo_transitions],
+                                 dtype=float),
+            "contrib": np.array([mot.contrib for mot in mo_transitions],
+                                dtype=float),
+            "back": np.array([mot.to_or_from == "<-"
+                              for mot in mo_transitions], dtype=bool),
+        }
+        return cls(states, data, spin_labels, spat_labels,
+                   trans_offsets, trans_data)
+
+    def __len__(self):
+        return len(self.states)
+
+    def __getattr__(self, attr):
+        # Only called when regular attribute lookup fails
+        try:
+            return self.__dict__["data"][attr]
+        except KeyError:
+            raise AttributeError(attr)
+
+    def __getitem__(self, key):
+        inds = np.arange(len(self))[key]
+        counts = np.diff(self.trans_offsets)[inds]
+        trans_offsets = np.zeros(inds.size+1, dtype=int)
+        trans_offsets[1:] = np.cumsum(counts)
+        # Indices of the transitions of all selected states
+        trans_inds = (np.repeat(self.trans_offsets[inds] - trans_offsets[:-1],
+                                counts)
+                      + np.arange(trans_offsets[-1]))
+        data = {key: column[inds] for key, column in self.data.items()}
+        trans_data = {key: column[trans_inds]
+                      for key, column in self.trans_data.items()}
+        return ExcitedStateTable(self.states[inds], data, self.spin_labels,
+                                 self.spat_labels, trans_offsets, trans_data)
+
+    @property
+    def excited_states(self):
+        return list(self.states)
+
+    def trans_state_inds(self):
+        """Index of the state every transition belongs to."""
+        return np.repeat(np.arange(len(self)), np.diff(self.trans_offsets))
+
+    def spat_mask(self, spat):
+        code = np.flatnonzero(self.spat_labels == spat)
+        if code.size == 0:
+            return np.zeros(len(self), dtype=bool)
+        return self.spat == code[0]
+
+    def range_mask(self, start=None, end=None):
+        """Mask of the states with start <= l <= end, both in nm."""
+        mask = np.ones(len(self), dtype=bool)
+        if start is not None:
+            mask &= self.l >= start
+        if end is not None:
+            mask &= self.l <= end
+        return mask
+
+    def f_mask(self, thresh):
+        return self.f >= thresh
+
+    def argsort_f(self):
+        """Indices sorting the states by decreasing oscillator strength."""
+        return np.argsort(-self.f, kind="stable")
+
+    def argsort_l(self):
+        """Indices sorting the states by decreasing wavelength."""
+        return np.argsort(-self.l, kind="stable")
+
+    def update_id_sorted(self):
+        """Enumerate the states in their current order, starting at 1."""
+        self.data["id_sorted"] = np.arange(1, len(self)+1)
+        for es, id_sorted in zip(self.states, self.id_sorted):
+            es.id_sorted = int(id_sorted)
+
+    def __str__(self):
+        return f"ExcitedStateTable({len(self)} states)"
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+
+import numpy as np
+
+
+def group_states(keys, state_inds):
+    """Map every row of 'keys' to the array of the states it occurs in."""
+    if len(keys) == 0:
+        return dict()
+    uniq_keys, inverse = np.unique(keys, axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+    order = np.argsort(inverse, kind="stable")
+    bounds = np.flatnonzero(np.diff(inverse[order])) + 1
+    groups = np.split(state_inds[order], bounds)
+    return {tuple(key): np.unique(group)
+            for key, group in zip(uniq_keys.tolist(), groups)}
+
+
+class MOIndex:
+    """Inverted index from MOs to the excited states with transitions from
+    or to them.
+
+    States are identified by their position in the table the index was
+    built from, as state ids may repeat, e.g. in optimization logs. The
+    index is built from the flat transition arrays of an
+    ExcitedStateTable, without touching the ExcitedState objects."""
+
+    empty = np.zeros(0, dtype=int)
+
+    def __init__(self, state_inds, start_mos, final_mos, size):
+        self.size = size
+        state_inds = np.asarray(state_inds, dtype=int)
+        start_mos = np.asarray(start_mos, dtype=int)
+        final_mos = np.asarray(final_mos, dtype=int)
+        self.start = group_states(start_mos[:,None], state_inds)
+        self.final = group_states(final_mos[:,None], state_inds)
+        self.pairs = group_states(np.stack((start_mos, final_mos), axis=1),
+                                  state_inds)
+
+    @classmethod
+    def from_table(cls, table):
+        return cls(table.trans_state_inds(), table.trans_data["start_mo"],
+                   table.trans_data["final_mo"], len(table))
+
+    def from_mo(self, mo):
+        """States with transitions starting from the given MO."""
+        return self.start.get((mo, ), self.empty)
+
+    def to_mo(self, mo):
+        """States with transitions ending in the given MO."""
+        return self.final.get((mo, ), self.empty)
+
+    def with_pair(self, start_mo, final_mo):
+        """States with a transition from start_mo to final_mo."""
+        return self.pairs.get((start_mo, final_mo), self.empty)
+
+    def from_mos(self, mos):
+        return np.concatenate([self.empty, ] + [self.from_mo(mo)
+                                                for mo in mos])
+
+    def to_mos(self, mos):
+        return np.concatenate([self.empty, ] + [self.to_mo(mo)
+                                                for mo in mos])
+
+    def with_pairs(self, pairs):
+        return np.concatenate([self.empty, ] + [self.with_pair(*pair)
+                                                for pair in pairs])
+
+    def mask(self, inds):
+        """Boolean mask of the given states."""
+        mask = np.zeros(self.size, dtype=bool)
+        mask[inds] = True
+        return mask
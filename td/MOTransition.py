@@ -1,19 +1,35 @@
 #!/usr/bin/env python3
 
+import sys
+
+
 class MOTransition:
+
+    __slots__ = (
+        "start_mo",
+        "to_or_from",
+        "final_mo",
+        "ci_coeff",
+        "contrib",
+        "start_spin",
+        "final_spin",
+        "start_irrep",
+        "final_irrep",
+    )
+
     def __init__(self, start_mo, to_or_from, final_mo, ci_coeff,
                  contrib, start_spin, final_spin,
                  start_irrep, final_irrep):
         self.start_mo = int(start_mo)
-        self.to_or_from = to_or_from
+        self.to_or_from = sys.intern(to_or_from)
         self.final_mo = int(final_mo)
         self.ci_coeff = float(ci_coeff)
 
         self.contrib = float(contrib)
-        self.start_spin = start_spin
-        self.final_spin = final_spin
-        self.start_irrep = start_irrep
-        self.final_irrep = final_irrep
+        self.start_spin = sys.intern(start_spin)
+        self.final_spin = sys.intern(final_spin)
+        self.start_irrep = sys.intern(start_irrep)
+        self.final_irrep = sys.intern(final_irrep)
 
     def outstr(self):
         return "\t{0:>5d}{1} {2} {3} {4:>5d}{5} {6}" \
@@ -4,7 +4,6 @@ import matplotlib as mpl
 import matplotlib.pyplot as plt
 import numpy as np
 
-from td.peakdetect import peakdetect
 from td.constants import NM2EV
 
 
@@ -16,14 +15,14 @@ class SpectraPlotter:
         self.peaks = peaks
         self.enum = enum
 
-        self.broadened = [getattr(spectrum, self.unit) for spectrum
+        self.broadened = [spectrum.in_unit(self.unit) for spectrum
                           in self.spectra]
         self.fig, self.ax = plt.subplots()
         self.ax2 = self.ax.twinx()
         self.colors = mpl.rcParams["axes.prop_cycle"]
 
     def plot_spectrum(self, spectrum, color):
-        broad_spec, osc_spec = getattr(spectrum, self.unit)
+        broad_spec, osc_spec = spectrum.in_unit(self.unit)
 
         self.ax.plot(broad_spec[:,0], broad_spec[:,1],
                      label=f"{spectrum.name}", **color)
@@ -59,7 +58,7 @@ class SpectraPlotter:
         for spectrum, color in zip(self.spectra, self.colors):
             self.plot_spectrum(spectrum, color)
 
-        if self.unit == "eV":
+        if self.unit in ("eV", "cm-1"):
             from_x, to_x = self.ax.get_xlim()
             self.ax.set_xlim(to_x, from_x)
 
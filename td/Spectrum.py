@@ -1,11 +1,288 @@
 #!/usr/bin/env python3
 
-import matplotlib.pyplot as plt
 import numpy as np
 
-from td.peakdetect import peakdetect
-
 NM2EV = 1240.6691
+# Conversion from eV to cm⁻¹, consistent with NM2EV
+EV2CM = 1e7 / NM2EV
+# Maximum number of (grid point, state) pairs evaluated at once in broaden()
+BROADEN_CHUNK_ELEMENTS = 2**22
+# Default width of the gaussian bands. Given as the wavelength in nm that
+# corresponds to 0.4 eV, i.e. sigma = 1e7 / 3099.6 cm⁻¹ ≈ 3226 cm⁻¹.
+SIGMA_CM = 3099.6
+# Default band width in eV
+WIDTH = NM2EV / SIGMA_CM
+LINE_SHAPES = ("gauss", "lorentz", "voigt")
+# Default lorentzian fraction of the pseudo-Voigt profile
+ETA = 0.5
+# Above this number of states broaden() switches from the exact sum of all
+# bands to the FFT based convolution.
+FFT_THRESHOLD = 2000
+# Energy grid points per sigma and kernel cutoff in multiples of sigma
+# used by broaden_fft()
+FFT_POINTS_PER_SIGMA = 200
+FFT_CUTOFF = 8
+# Bands are neglected where they dropped below this fraction of their
+# height in broaden_windowed(), which works on blocks of this many grid
+# points.
+WINDOW_TOL = 1e-12
+WINDOW_BLOCK = 256
+# Units of the x-axis of a spectrum and the default steps of their uniform
+# grids. The steps in eV and cm⁻¹ are similar, with ≥ 40 points per width.
+UNITS = ("nm", "eV", "cm-1")
+GRID_STEPS = {
+    "nm": 0.5,
+    "eV": 0.01,
+    "cm-1": 80.,
+}
+
+
+def to_eV(x, unit):
+    """Convert x given in 'unit' to eV."""
+    x = np.asarray(x, dtype=float)
+    if unit == "nm":
+        return NM2EV / x
+    elif unit == "eV":
+        return x
+    elif unit == "cm-1":
+        return x / EV2CM
+    raise ValueError(f"Unknown unit '{unit}'! Valid units are "
+                     f"{', '.join(UNITS)}.")
+
+
+def from_eV(E, unit):
+    """Convert E given in eV to 'unit'."""
+    E = np.asarray(E, dtype=float)
+    if unit == "cm-1":
+        return E * EV2CM
+    # nm <-> eV and eV <-> eV are their own inverse
+    return to_eV(E, unit)
+
+
+def convert(x, unit, to_unit):
+    return from_eV(to_eV(x, unit), to_unit)
+
+
+def uniform_grid(start, end, unit, step=None, points=None):
+    """Uniform grid in 'unit' spanning start and end, given in 'unit'.
+
+    Either the number of points or the step is used, defaulting to the
+    step from GRID_STEPS."""
+    start, end = sorted((start, end))
+    if points is not None:
+        return np.linspace(start, end, points)
+    if step is None:
+        step = GRID_STEPS[unit]
+    return np.arange(start, end, step)
+
+
+def gauss_uv_band(x, osc, x_i, sigma=SIGMA_CM):
+    return (1.3062974e8 * osc / (1e7 / sigma) *
+            np.exp(-((1. / x - 1. / x_i) / (1. / sigma))**2))
+
+
+def state_widths(E_i, width=WIDTH):
+    """Band widths in eV for states with the energies E_i in eV.
+
+    'width' may be a scalar, an array with one width per state or a
+    callable that returns the widths for the given state energies, e.g.
+    to use broader bands for higher lying states."""
+    E_i = np.asarray(E_i, dtype=float)
+    if callable(width):
+        width = width(E_i)
+    return np.broadcast_to(np.asarray(width, dtype=float), E_i.shape)
+
+
+def bands(E, E_i, osc, widths, line_shape="gauss", eta=ETA):
+    """ε in l mol⁻¹ cm⁻¹ at the energies E of bands centered at E_i.
+
+    Energies and widths are given in eV. All arguments are broadcast
+    against each other, so E[:,None] and arrays over the states yield all
+    bands on a (grid points x states) array in one vectorized evaluation.
+
+    'widths' is the 1/e half width of the gaussian. The lorentzian has the
+    same FWHM and the pseudo-Voigt profile mixes both with the lorentzian
+    fraction 'eta'. All line shapes yield the same integrated absorption,
+    ∫ε dν = 1.3062974e8 * sqrt(π) * f with ν in cm⁻¹."""
+    dE = E - E_i
+    if line_shape not in LINE_SHAPES:
+        raise ValueError(f"Unknown line shape '{line_shape}'! Valid line "
+                         f"shapes are {', '.join(LINE_SHAPES)}.")
+    if line_shape in ("gauss", "voigt"):
+        gauss = (1.3062974e8 * osc / (widths * EV2CM)
+                 * np.exp(-(dE / widths)**2))
+        if line_shape == "gauss":
+            return gauss
+    gamma = widths * np.sqrt(np.log(2))
+    lorentz = (1.3062974e8 / np.sqrt(np.pi) * osc / EV2CM
+               * gamma / (dE**2 + gamma**2))
+    if line_shape == "lorentz":
+        return lorentz
+    return eta * lorentz + (1 - eta) * gauss
+
+
+def window_width(widths, line_shape="gauss", tol=WINDOW_TOL):
+    """Distance in eV from the centre, beyond which all bands with the
+    given widths dropped below tol times their height."""
+    width = np.max(widths)
+    if line_shape == "gauss":
+        return np.sqrt(-np.log(tol)) * width
+    # The lorentzian dominates the tails of the pseudo-Voigt profile
+    return np.sqrt(1 / tol) * np.sqrt(np.log(2)) * width
+
+
+def broaden_exact(E, E_i, osc, width=WIDTH, line_shape="gauss", eta=ETA):
+    """Broadened spectrum in l mol⁻¹ cm⁻¹ at the energies E (eV) for
+    sticks with energies E_i (eV) and oscillator strengths osc, summed
+    over all bands."""
+    E = np.asarray(E, dtype=float)
+    E_i = np.asarray(E_i, dtype=float)
+    osc = np.asarray(osc, dtype=float)
+    widths = state_widths(E_i, width)
+    # Evaluate all bands at once on a (grid points x states) array. For
+    # big grids and many states this is done in chunks of grid points
+    # to keep the memory usage bounded.
+    chunk_size = max(1, BROADEN_CHUNK_ELEMENTS // max(1, E_i.size))
+    spectrum = np.zeros_like(E)
+    for start in range(0, E.size, chunk_size):
+        E_chunk = E[start:start+chunk_size, None]
+        spectrum[start:start+chunk_size] = bands(E_chunk, E_i, osc, widths,
+                                                 line_shape, eta).sum(axis=1)
+    return spectrum
+
+
+def broaden_windowed(E, E_i, osc, width=WIDTH, line_shape="gauss", eta=ETA,
+                     tol=WINDOW_TOL, block_size=WINDOW_BLOCK):
+    """Broadened spectrum in l mol⁻¹ cm⁻¹ at the energies E (eV) for
+    sticks with energies E_i (eV) and oscillator strengths osc.
+
+    The bands are only evaluated where they are larger than tol times their
+    height, e.g. within sqrt(-ln(tol)) * width of their centre for
+    gaussians. The states are sorted by energy and for every block of grid
+    points the overlapping states are found with np.searchsorted, so the
+    work scales with the local density of states instead of grid points x
+    states. Compared to the sum over all bands the absolute error is
+    bounded by tol times the sum of all band heights. As lorentzians decay
+    slowly, their window spans about 1e6 widths with the default tol, so
+    this only pays off for gaussian bands."""
+    E = np.asarray(E, dtype=float)
+    E_i = np.asarray(E_i, dtype=float)
+    osc = np.asarray(osc, dtype=float)
+    widths = state_widths(E_i, width)
+    sort_inds = np.argsort(E_i)
+    E_i = E_i[sort_inds]
+    osc = osc[sort_inds]
+    widths = widths[sort_inds]
+    window = window_width(widths, line_shape, tol)
+
+    spectrum = np.zeros_like(E)
+    for start in range(0, E.size, block_size):
+        E_block = E[start:start+block_size]
+        lo = np.searchsorted(E_i, E_block.min() - window, side="left")
+        hi = np.searchsorted(E_i, E_block.max() + window, side="right")
+        if lo == hi:
+            continue
+        block_bands = bands(E_block[:,None], E_i[lo:hi], osc[lo:hi],
+                            widths[lo:hi], line_shape, eta)
+        spectrum[start:start+block_size] = block_bands.sum(axis=1)
+    return spectrum
+
+
+def broaden_fft(E, E_i, osc, width=WIDTH,
+                points_per_sigma=FFT_POINTS_PER_SIGMA, cutoff=FFT_CUTOFF):
+    """Broadened spectrum in l mol⁻¹ cm⁻¹ at the energies E (eV) for
+    sticks with energies E_i (eV) and oscillator strengths osc, using
+    gaussian bands of the same width (eV).
+
+    The sticks are binned onto a uniform energy grid with spacing
+    h = width / points_per_sigma, using linear weights for the two
+    neighbouring grid points. The histogram is convolved with the gaussian
+    kernel, truncated at cutoff * width, via FFT. The result is linearly
+    interpolated onto E. The cost is O(G log G) for G grid points,
+    independent of the number of sticks.
+
+    Both the binning and the final interpolation are linear interpolations
+    of gaussians with a second derivative of at most 2 A f / width**2,
+    so compared to the exact sum of gauss_uv_band the absolute error
+    at any point is bounded by
+
+        |ε_fft - ε_exact| <= (h / width)**2 / 2 * A * sum(osc)
+                             + A * sum(osc) * exp(-cutoff**2)
+
+    with the band height per unit oscillator strength
+    A = 1.3062974e8 / (width * EV2CM). With the defaults this is about
+    1.3e-5 * A * sum(osc)."""
+    E = np.asarray(E, dtype=float)
+    E_i = np.asarray(E_i, dtype=float)
+    osc = np.asarray(osc, dtype=float)
+    h = width / points_per_sigma
+    pad = cutoff * width
+
+    # Uniform energy grid, padded by the kernel width on both sides
+    E_lo = E.min() - pad
+    grid_size = int(np.ceil((E.max() + pad - E_lo) / h)) + 1
+    # Linear binning of the sticks. Sticks further than the cutoff away
+    # from all requested points are dropped.
+    pos = (E_i - E_lo) / h
+    keep = (pos >= 0) & (pos < grid_size - 1)
+    pos = pos[keep]
+    weights = osc[keep]
+    lower = np.floor(pos).astype(int)
+    frac = pos - lower
+    hist = (np.bincount(lower, weights*(1-frac), minlength=grid_size)
+            + np.bincount(lower+1, weights*frac, minlength=grid_size))
+
+    half_width = int(np.ceil(pad / h))
+    offsets = np.arange(-half_width, half_width+1) * h
+    kernel = bands(offsets, 0., 1., width, "gauss")
+    fft_size = grid_size + kernel.size - 1
+    conv = np.fft.irfft(np.fft.rfft(hist, fft_size)
+                        * np.fft.rfft(kernel, fft_size), fft_size)
+    conv = conv[half_width:half_width+grid_size]
+
+    grid = E_lo + h * np.arange(grid_size)
+    return np.interp(E, grid, conv)
+
+
+def broaden_ensemble(spectra, grid_eV, line_shape=None, width=None,
+                     eta=None):
+    """Broaden the states of several spectra on a shared energy grid.
+
+    The states of all spectra are stacked into one array and broadened in
+    a single vectorized pass. 'width' may be a scalar or a callable of the
+    state energies, see state_widths(). If it is not given, the width of
+    every spectrum is used, so per-state widths are kept. The line shape
+    and eta default to those of the first spectrum. Returns an array of
+    shape (len(spectra), grid points) holding ε in l mol⁻¹ cm⁻¹ for every
+    spectrum."""
+    if line_shape is None:
+        line_shape = spectra[0].line_shape
+    if eta is None:
+        eta = spectra[0].eta
+    counts = [len(spectrum.excited_states) for spectrum in spectra]
+    offsets = np.cumsum([0, ] + counts[:-1])
+    sticks = np.array([(es.l, es.f) for spectrum in spectra
+                       for es in spectrum.excited_states])
+    # Excitation energies in eV
+    E_i = NM2EV / sticks[:,0]
+    osc = sticks[:,1]
+    widths = np.concatenate([
+        state_widths(E_i[offset:offset+count],
+                     spectrum.width if width is None else width)
+        for spectrum, offset, count in zip(spectra, offsets, counts)
+    ])
+
+    chunk_size = max(1, BROADEN_CHUNK_ELEMENTS // E_i.size)
+    broadened = np.zeros((len(spectra), grid_eV.size))
+    for start in range(0, grid_eV.size, chunk_size):
+        E = grid_eV[start:start+chunk_size, None]
+        chunk_bands = bands(E, E_i, osc, widths, line_shape, eta)
+        # Sum the bands belonging to the same spectrum
+        broadened[:,start:start+chunk_size] = np.add.reduceat(
+            chunk_bands, offsets, axis=1
+        ).T
+    return broadened
+
 
 class Spectrum:
 
@@ -21,45 +298,157 @@ class Spectrum:
         self.eV_range = NM2EV / self.nm_range
         """
         self.gs_energy = gs_energy
+        # Steps of the uniform grids in nm, eV and cm⁻¹ on which the
+        # spectra are broadened. If 'grid_points' is set, the grids use
+        # this number of points instead.
+        self.grid_steps = GRID_STEPS.copy()
+        self.grid_points = None
+        # Line shape, band width(s) in eV and lorentzian fraction of the
+        # pseudo-Voigt profile used for broadening. The width may be a
+        # scalar, an array with one width per state or a callable of the
+        # state energies in eV.
+        self.line_shape = "gauss"
+        self.width = WIDTH
+        self.eta = ETA
+        # 'exact', 'window', 'fft' or 'auto'. For gaussian bands the latter
+        # uses the windowed broadening and switches to the FFT based
+        # convolution for more than FFT_THRESHOLD states. Lorentzian and
+        # pseudo-Voigt bands are summed exactly, as their slowly decaying
+        # tails span the whole grid anyway.
+        self.broaden_method = "auto"
 
     @property
     def es(self):
         return self.excited_states
 
+    @property
+    def excited_states(self):
+        return self._excited_states
+
+    @excited_states.setter
+    def excited_states(self, excited_states):
+        self._excited_states = excited_states
+        self.clear_cache()
+
+    @property
+    def nm_range(self):
+        return self._nm_range
+
+    @nm_range.setter
+    def nm_range(self, nm_range):
+        self._nm_range = nm_range
+        self.clear_cache()
+
+    @property
+    def nm_step(self):
+        return self.grid_steps["nm"]
+
+    @nm_step.setter
+    def nm_step(self, nm_step):
+        self.grid_steps["nm"] = nm_step
+
+    def clear_cache(self):
+        self._broadened = dict()
+
+    def grid(self, unit):
+        """Uniform grid in 'unit', spanning the wavelength range."""
+        if unit == "nm":
+            start, end = self.nm_range
+        else:
+            start, end = convert(self.nm_range, "nm", unit)
+        return uniform_grid(start, end, unit, self.grid_steps[unit],
+                            self.grid_points)
+
+    def broaden_key(self):
+        """Key identifying the result of the broadening.
+
+        It holds the grid and the line shape, but not the states, so it is
+        cheap to build even for many states. Assigning excited_states
+        clears the cache. After modifying the states in place, e.g. by
+        --enoffset or --zeroosc, call clear_cache()."""
+        width = self.width
+        if isinstance(width, np.ndarray):
+            width = (width.shape, hash(width.tobytes()))
+        return (tuple(self.nm_range), tuple(self.grid_steps.items()),
+                self.grid_points, self.line_shape, width, self.eta,
+                self.broaden_method)
+
+    def broadened(self, unit="nm"):
+        """Return the cached broadened spectrum and the sticks in 'unit'.
+
+        The spectrum is broadened directly on the uniform grid in 'unit'.
+        The returned arrays are read-only, as they are shared between
+        all callers. Copy them before modifying."""
+        key = self.broaden_key()
+        try:
+            cached_key, broadened = self._broadened[unit]
+            if cached_key == key:
+                return broadened
+        except KeyError:
+            pass
+        broadened = self.broaden_grid(self.grid(unit), unit)
+        for arr in broadened:
+            arr.setflags(write=False)
+        self._broadened[unit] = (key, broadened)
+        return broadened
+
     def gauss_uv_band(self, x, osc, x_i):
-        return (1.3062974e8 * osc / (1e7 / 3099.6) *
-                np.exp(-((1. / x - 1. / x_i) / (1. / 3099.6))**2))
+        return gauss_uv_band(x, osc, x_i)
 
     @property
     def nm(self):
-        return self.broaden(*self.nm_range)
+        return self.broadened("nm")
 
     @property
     def eV(self):
-        in_nm, osc_nm = self.nm
-        in_eV = in_nm
-        in_eV[:,0] = NM2EV / in_nm[:,0]
-        osc_in_eV = osc_nm 
-        osc_in_eV[:,0] = NM2EV / osc_in_eV[:,0]
-        return in_eV, osc_in_eV
+        return self.broadened("eV")
+
+    @property
+    def cm(self):
+        """Spectrum in cm⁻¹."""
+        return self.broadened("cm-1")
+
+    def in_unit(self, unit):
+        return self.broadened(unit)
 
     def broaden(self, from_nm, to_nm):
+        x = uniform_grid(from_nm, to_nm, "nm", self.nm_step)
+        return self.broaden_grid(x, "nm")
+
+    def broaden_grid(self, x, unit="nm"):
         # According to:
         # http://www.gaussian.com/g_whitepap/tn_uvvisplot.htm
         # wave lengths and oscillator strengths
         # E(eV) = 1240.6691 eV * nm / l(nm)
-        NM2EV = 1240.6691
-
         osc_nm = np.array([(es.l, es.f) for es in self.excited_states])
-        x = np.arange(from_nm, to_nm, 0.5)
-        spectrum = list()
-        for l in x:
-            spectrum.append(np.sum([self.gauss_uv_band(l, osc, l_i)
-                            for l_i, osc in osc_nm]))
-        spectrum = np.array(spectrum)
+        l_i, osc = osc_nm.T
+        E = to_eV(x, unit)
+        E_i = to_eV(l_i, "nm")
+        osc_x = np.stack((convert(l_i, "nm", unit), osc), axis=-1)
+        method = self.broaden_method
+        # The FFT based convolution needs gaussians of the same width
+        fft_possible = ((self.line_shape == "gauss")
+                        and np.isscalar(self.width))
+        if (method == "auto") and (self.line_shape != "gauss"):
+            method = "exact"
+        elif method == "auto":
+            use_fft = fft_possible and (l_i.size > FFT_THRESHOLD)
+            method = "fft" if use_fft else "window"
+        if (method == "fft") and not fft_possible:
+            raise ValueError("FFT based broadening is only possible for "
+                             "gaussian bands of the same width!")
+        broaden_funcs = {
+            "exact": broaden_exact,
+            "window": broaden_windowed,
+        }
+        if method == "fft":
+            spectrum = broaden_fft(E, E_i, osc, self.width)
+        else:
+            spectrum = broaden_funcs[method](E, E_i, osc, self.width,
+                                             self.line_shape, self.eta)
         spectrum_norm = spectrum / spectrum.max()
-        in_nm = np.stack((x, spectrum, spectrum_norm), axis=-1)
-        return in_nm, osc_nm
+        in_x = np.stack((x, spectrum, spectrum_norm), axis=-1)
+        return in_x, osc_x
 
         """
         if e2f:
@@ -142,8 +531,11 @@ class Spectrum:
     """
 
     def get_peak_inds(self, conv_spectrum, lookahead=25):
+        from td.peaks import detect_peaks
+
         conv_spectrum_ys = conv_spectrum[:,1]
-        max_peaks, min_peaks = peakdetect(conv_spectrum_ys, lookahead=lookahead)
+        max_peaks, min_peaks = detect_peaks(conv_spectrum_ys,
+                                            lookahead=lookahead)
         return np.array(max_peaks)[:,0].astype(int)
 
 
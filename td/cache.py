@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+
+"""On-disk cache of parsed logs.
+
+Every parsed log is stored as a pickle in the cache directory. The entries
+are keyed by the path, size, modification time and content hash of the log
+and by the td version, so repeated runs on an unchanged log skip parsing
+completely. When the cache grows beyond its size limit the least recently
+used entries are evicted.
+
+The cache directory defaults to $XDG_CACHE_HOME/td (~/.cache/td) and may
+be changed with the TD_CACHE_DIR environment variable. The size limit in
+MB is taken from TD_CACHE_SIZE."""
+
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+
+import td
+
+# Has to be increased whenever the layout of the cached objects changes
+FORMAT_VERSION = 3
+
+
+def default_cache_dir():
+    try:
+        return os.environ["TD_CACHE_DIR"]
+    except KeyError:
+        cache_home = os.environ.get("XDG_CACHE_HOME",
+                                    os.path.expanduser("~/.cache"))
+        return os.path.join(cache_home, "td")
+
+
+def default_max_size():
+    return int(float(os.environ.get("TD_CACHE_SIZE", 512)) * 2**20)
+
+
+class LogCache:
+
+    entry_ext = ".pickle"
+
+    def __init__(self, cache_dir=None, max_size=None):
+        if cache_dir is None:
+            cache_dir = default_cache_dir()
+        if max_size is None:
+            max_size = default_max_size()
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+
+    def key(self, fn, buf):
+        """Cache key for the log 'fn', whose contents are given in 'buf'."""
+        stat = os.stat(fn)
+        content_hash = hashlib.blake2b(buf, digest_size=20).hexdigest()
+        key_items = (os.path.abspath(fn), str(stat.st_size),
+                     str(stat.st_mtime_ns), td.__version__,
+                     str(FORMAT_VERSION), content_hash)
+        return hashlib.blake2b("\0".join(key_items).encode("utf-8"),
+                               digest_size=20).hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.cache_dir, key + self.entry_ext)
+
+    def entries(self):
+        try:
+            fns = os.listdir(self.cache_dir)
+        except FileNotFoundError:
+            return list()
+        entries = list()
+        for fn in fns:
+            if not fn.endswith(self.entry_ext):
+                continue
+            path = os.path.join(self.cache_dir, fn)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def load(self, key):
+        """Return the cached data for 'key' or None if there is none."""
+        path = self.entry_path(key)
+        try:
+            with open(path, "rb") as handle:
+                data = pickle.load(handle)
+        except FileNotFoundError:
+            return None
+        except Exception as err:
+            # Unreadable or outdated entries are treated as a cache miss
+            logging.warning(f"Ignoring broken cache entry {path}: {err}")
+            return None
+        # Mark the entry as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return data
+
+    def store(self, key, data):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Write to a temporary file first, so concurrent runs never see
+            # a partially written entry.
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir,
+                                            suffix=".tmp")
+            with os.fdopen(fd, "wb") as handle:
+                pickle.dump(data, handle, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.entry_path(key))
+        except OSError as err:
+            logging.warning(f"Couldn't write to cache {self.cache_dir}: "
+                            f"{err}")
+            return
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits
+        into its size limit."""
+        entries = sorted(self.entries(), key=lambda entry: entry[2])
+        size = sum([entry[1] for entry in entries])
+        for path, entry_size, _ in entries:
+            if size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            size -= entry_size
+
+    def stats(self):
+        entries = self.entries()
+        return {
+            "cache_dir": self.cache_dir,
+            "entries": len(entries),
+            "size": sum([entry[1] for entry in entries]),
+            "max_size": self.max_size,
+        }
+
+    def print_stats(self):
+        stats = self.stats()
+        print(f"Cache directory: {stats['cache_dir']}")
+        print(f"Entries: {stats['entries']}")
+        print(f"Size: {stats['size'] / 2**20:.2f} MB of "
+              f"{stats['max_size'] / 2**20:.2f} MB")
@@ -5,20 +5,15 @@ import os
 import re
 import sys
 
-from jinja2 import Environment, FileSystemLoader
-import pandas as pd
-
 from td.helper_funcs import chunks, THIS_DIR
+from td.tabulate import column_layout, tabulate_lines
 
-try:
-    from docx import Document
-except ImportError:
-    pass
-
-from td.tabulate import tabulate
+# jinja2, pandas and python-docx are only imported by the exporters that
+# need them, to keep the startup time of td low.
 
 __all__ = [
             "print_table",
+            "print_summary",
             "as_table",
             "as_docx",
             "as_tiddly_table",
@@ -27,13 +22,106 @@ __all__ = [
             "as_dataframe",
 ]
 
+TABLE_HEADERS = ["# org.", "# sort.", "2S+1", "Spat.", "dE in eV",
+                 "l in nm", "f", "<S**2>"]
+TABLE_FLOATFMT = ["", "", "", "", ".2f", ".1f", ".5f", ""]
+
+def table_layout(excited_states):
+    """Layout of the columns of the table of the states, see
+    tabulate.column_layout().
+
+    It is found from a small sample holding the smallest and largest ids,
+    energies, wavelengths, oscillator strengths and <S**2> and the
+    distinct labels, so the rows don't have to be built beforehand."""
+    def value_range(attr):
+        values = [getattr(es, attr) for es in excited_states]
+        return [min(values), max(values)]
+
+    def distinct(attr):
+        return list(dict.fromkeys(getattr(es, attr) for es in excited_states))
+
+    # <S**2> is '???' when it isn't available.
+    if all(isinstance(es.s2, float) for es in excited_states):
+        s2_type, s2_sample = float, value_range("s2")
+    else:
+        s2_type, s2_sample = str, distinct("s2")
+    # The spin labels may be numbers, e.g. for RICC2, so the types of the
+    # labels are still detected.
+    coltypes = [int, int, None, None, float, float, float, s2_type]
+    sample = [value_range("id"), value_range("id_sorted"), distinct("spin"),
+              distinct("spat"), value_range("dE"), value_range("l"),
+              value_range("f"), s2_sample]
+    # Pad all columns to the same length with their first value
+    length = max(len(values) for values in sample)
+    sample = [values + values[:1] * (length - len(values))
+              for values in sample]
+    return column_layout(zip(*sample), TABLE_HEADERS, TABLE_FLOATFMT,
+                         coltypes=coltypes)
+
+def table_lines(excited_states):
+    """Yield the lines of the table of the states: the header, the line
+    below it and one row per state.
+
+    The column widths are found from the range of the values beforehand,
+    so the header is yielded right away, every row is formatted as it is
+    needed and the lines are the same as those of tabulate(). Without
+    states only the header is yielded."""
+    if not excited_states:
+        for line in tabulate_lines([], headers=TABLE_HEADERS):
+            yield line
+        return
+    layout = table_layout(excited_states)
+    as_list = (exc_state.as_list() for exc_state in excited_states)
+    lines = tabulate_lines(as_list, headers=TABLE_HEADERS,
+                           floatfmt=TABLE_FLOATFMT, layout=layout)
+    for line in lines:
+        yield line
+
 def print_table(excited_states):
-    as_list = [exc_state.as_list() for exc_state in excited_states]
-    floatfmt = ["", "", "", "", ".2f", ".1f", ".5f", ""]
-    print(tabulate(as_list,
-                   headers=["# org.", "# sort.", "2S+1", "Spat.", "dE in eV",
-                            "l in nm", "f", "<S**2>"],
-                   floatfmt=floatfmt))
+    for line in table_lines(excited_states):
+        print(line)
+
+def summary_blocks(excited_states, verbose_mos=None):
+    """Yield the summary of every state as a list of lines: the table
+    header, the row of the state and its MO transitions, followed by
+    their verbose names if verbose_mos is given.
+
+    All states share the column widths of one table. Missing verbose MO
+    names are reported only once."""
+    if not excited_states:
+        return
+    lines = table_lines(excited_states)
+    header = [next(lines), next(lines)]
+    missing = set()
+    for exc_state, row in zip(excited_states, lines):
+        block = header + [row, ]
+        for mot in exc_state.mo_transitions:
+            # Suppresss backexcitations like
+            # 89B <- 90B
+            if mot.to_or_from == "<-":
+                continue
+            block.append(mot.outstr())
+            if not verbose_mos:
+                continue
+            start_tpl = mot.start_tpl()
+            final_tpl = mot.final_tpl()
+            start_mo_verbose = verbose_mos.get(start_tpl)
+            final_mo_verbose = verbose_mos.get(final_tpl)
+            if (start_mo_verbose is None) or (final_mo_verbose is None):
+                tpl = start_tpl if (start_mo_verbose is None) else final_tpl
+                if tpl not in missing:
+                    missing.add(tpl)
+                    logging.warning("Verbose MO name for {} {}"
+                                    " missing!".format(*tpl))
+                continue
+            block.append("\t\t{0} -> {1}".format(start_mo_verbose,
+                                                 final_mo_verbose))
+        yield block
+
+def print_summary(excited_states, verbose_mos=None, end="\n\n"):
+    """Print the summaries of the states, each followed by 'end'."""
+    for block in summary_blocks(excited_states, verbose_mos):
+        sys.stdout.write("\n".join(block) + end)
 
 def as_table(excited_states, verbose_mos, newline_str="\n"):
     # The table header
@@ -92,8 +180,10 @@ def as_table(excited_states, verbose_mos, newline_str="\n"):
 
 def as_docx(excited_states, verbose_mos):
     """Export the supplied excited states into a .docx-document."""
-    # Check if docx was imported properly. If not exit.
-    if "docx" not in sys.modules:
+    # Check if docx can be imported. If not exit.
+    try:
+        from docx import Document
+    except ImportError:
         logging.error("Could't import python-docx-module.")
         sys.exit()
 
@@ -137,6 +227,8 @@ def as_tiddly_table(excited_states, verbose_mos):
 def as_theodore(excited_states, fn):
     """Combine the NTO-pictures generated by THEOdore/JMOl with
     the information parsed by td.py in a new .html-document."""
+    from jinja2 import Environment, FileSystemLoader
+
     # Search for  NTO-pictures in ./theodore
     pngs = [f for f in os.listdir("./theodore")
             if f.endswith(".png")]
@@ -185,16 +277,19 @@ def as_theodore(excited_states, fn):
 
 
 def as_booktabs(excited_states):
-    as_list = [exc_state.as_list() for exc_state in excited_states]
-    nr, mult, sym, eV, nm, f, spin = zip(*as_list)
-    eV = ["{:.2f}".format(_) for _ in eV]
-    f = ["{:.4f}".format(_) for _ in f]
-    nm = ["{:.1f}".format(_) for _ in nm]
-    for_booktabs = zip(nr, sym, eV, nm, f)
-    print(tabulate(for_booktabs, tablefmt="latex_booktabs"))
+    attrs = ("id", "spat", "dE", "l", "f")
+    for_booktabs = (es.as_list(attrs) for es in excited_states)
+    floatfmt = ["", "", ".2f", ".1f", ".4f"]
+    coltypes = [int, None, float, float, float]
+    lines = tabulate_lines(for_booktabs, tablefmt="latex_booktabs",
+                           floatfmt=floatfmt, coltypes=coltypes)
+    for line in lines:
+        print(line)
 
 
 def as_dataframe(excited_states):
+    import pandas as pd
+
     attrs = ("id", "l", "dE", "f")
     as_lists = [es.as_list(attrs) for es in excited_states]
     df = pd.DataFrame(as_lists, columns=attrs)
@@ -1,4 +1,10 @@
+import contextlib
+import functools
+import io
+import logging
+import mmap
 import os
+import sys
 
 IRREPS_REPL = {
     "'": "_",
@@ -20,3 +26,143 @@ def conv(to_convert, fmt_str):
 def chunks(lst, n):
     for i in range(0, len(lst), n):
         yield lst[i:i+n]
+
+
+def as_buffer(text):
+    """Return a bytes-like buffer for the given log contents. Strings are
+    encoded, buffers (bytes, mmap) are returned unchanged."""
+    if isinstance(text, str):
+        text = text.encode("utf-8")
+    return text
+
+
+@contextlib.contextmanager
+def open_log(fn):
+    """Open a log file as a read-only memory map, so it can be searched
+    with bytes regexes without reading and decoding it as a whole."""
+    with open(fn, "rb") as handle:
+        try:
+            buf = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files can't be mapped
+            yield b""
+            return
+        try:
+            yield buf
+        finally:
+            buf.close()
+
+
+def iter_lines(text):
+    """Iterate over the lines of a log as bytes, without splitting the whole
+    log at once. 'text' may be a string, a buffer (bytes, mmap) or an
+    iterable of lines, e.g. an open file handle."""
+    if isinstance(text, (str, bytes, bytearray)):
+        text = io.BytesIO(as_buffer(text))
+    elif isinstance(text, mmap.mmap):
+        text.seek(0)
+        text = iter(text.readline, b"")
+    for line in text:
+        if isinstance(line, str):
+            line = line.encode("utf-8")
+        yield line
+
+
+class StepNotFoundError(LookupError):
+    """Raised by find_block() when the log holds fewer blocks than the
+    requested step."""
+
+
+def find_block(buf, marker, step, accept=None):
+    """Byte offsets (start, end) of the step-th block in a log buffer.
+    Every block starts with 'marker' and ends where the next block starts,
+    or at the end of the log. Markers at offsets for which
+    accept(buf, offset) is False don't start a block.
+
+    Steps count from 1. Negative steps count from the end, so -1 is the
+    last block. These are searched backwards from the end of the log,
+    so only the blocks after the requested one are visited."""
+    if step == 0:
+        raise ValueError("Steps count from 1 or from -1 at the end.")
+    start = -1 if step > 0 else len(buf)
+    found = 0
+    while found < abs(step):
+        if step > 0:
+            start = buf.find(marker, start + 1)
+        else:
+            start = buf.rfind(marker, 0, start)
+        if start == -1:
+            raise StepNotFoundError(f"Couldn't find step {step} in the log, "
+                                    "as there are fewer blocks starting "
+                                    f"with '{marker.decode()}'!")
+        if (accept is None) or accept(buf, start):
+            found += 1
+    end = start
+    while True:
+        end = buf.find(marker, end + 1)
+        if end == -1:
+            end = len(buf)
+            break
+        if (accept is None) or accept(buf, end):
+            break
+    return start, end
+
+
+class MessageRecorder(logging.Handler, io.TextIOBase):
+    """Records logged messages and text written to it, e.g. as stdout."""
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.messages = list()
+
+    def emit(self, record):
+        self.messages.append(("log", record.levelno, record.getMessage()))
+
+    def write(self, text):
+        self.messages.append(("print", text))
+        return len(text)
+
+
+def record_messages(func, *args, **kwargs):
+    """Call func and record the messages it logs and prints instead of
+    emitting them. Returns the result and the messages, which can be
+    emitted later, as often as needed, with replay_messages()."""
+    recorder = MessageRecorder()
+    root = logging.getLogger()
+    handlers = root.handlers
+    root.handlers = [recorder, ]
+    try:
+        with contextlib.redirect_stdout(recorder):
+            result = func(*args, **kwargs)
+    finally:
+        root.handlers = handlers
+    return result, recorder.messages
+
+
+def replay_messages(messages):
+    for message in messages:
+        if message[0] == "log":
+            _, level, msg = message
+            logging.log(level, msg)
+        else:
+            print(message[1], end="")
+
+
+def decode(items):
+    """Decode a sequence of bytes as returned by a bytes regex."""
+    return [item.decode("utf-8") for item in items]
+
+
+def handle_broken_pipe(func):
+    """Exit quietly when stdout is closed early, e.g. when piping into head."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        except BrokenPipeError:
+            # Python flushes stdout again at exit, which would raise another
+            # BrokenPipeError, so point stdout to devnull.
+            devnull = os.open(os.devnull, os.O_WRONLY)
+            os.dup2(devnull, sys.stdout.fileno())
+            sys.exit(1)
+    return wrapper
@@ -4,27 +4,31 @@
 # PYTHON_ARGCOMPLETE_OK
 
 import argparse
+import concurrent.futures
+import functools
 import itertools
 import logging
-import matplotlib.pyplot as plt
 import os
 import re
 import shutil
 import sys
 
 import numpy as np
-import simplejson as json
-import yaml
 
-from td.constants import kB, EV2NM, HARTREE2EV
-from td.helper_funcs import chunks, THIS_DIR
+from td.cache import LogCache
+from td.constants import kB, EV2NM, HARTREE2EV, NM2EV
+from td.helper_funcs import (chunks, handle_broken_pipe, open_log,
+                             record_messages, replay_messages,
+                             StepNotFoundError, THIS_DIR)
 from td.ExcitedState import ExcitedState
+from td.ExcitedStateTable import ExcitedStateTable
+from td.MOIndex import MOIndex
 from td.export import *
 import td.parser.gaussian as gaussian
 import td.parser.orca as orca
 import td.parser.turbomole as turbo
-from td.Spectrum import Spectrum
-from td.SpectraPlotter import SpectraPlotter
+from td.Spectrum import (Spectrum, broaden_ensemble, from_eV, LINE_SHAPES,
+                         WIDTH, ETA)
 
 # Optional modules
 try:
@@ -33,22 +37,36 @@ except ImportError:
     pass
 
 
+# Number of bytes at the beginning of a log that are searched to determine
+# the program that produced it.
+HEADER_SIZE = 16384
+# Step in eV of the energy grid used for Boltzmann averaged spectra
+BOLTZMANN_STEP = 0.005
+
+
 def is_orca(text):
-    orca_re = "\* O   R   C   A \*"
+    orca_re = rb"\* O   R   C   A \*"
     return re.search(orca_re, text)
 
 
 def is_turbomole_escf(text):
-    escf_re = "e s c f"
+    escf_re = rb"e s c f"
     return re.search(escf_re, text)
 
 
 def is_turbomole_ricc2(text):
-    escf_re = "R I C C 2 - PROGRAM"
+    escf_re = rb"R I C C 2 - PROGRAM"
     return re.search(escf_re, text)
 
 
+def is_gaussian(text):
+    gaussian_re = rb"Entering Gaussian System"
+    return re.search(gaussian_re, text)
+
+
 def load_nto_yaml():
+    import yaml
+
     yaml_fn = "ntos.yaml"
     with open(yaml_fn) as handle:
         as_dict = yaml.load(handle.read())
@@ -81,18 +99,25 @@ def set_ntos(excited_states, ntos):
 
 
 def get_parser(fn, text):
-    # TURBOMOLE escf
-    if is_turbomole_escf(text):
-        return turbo.parse_escf
-    # TURBOMOLE ricc2
-    elif is_turbomole_ricc2(text):
-        return turbo.parse_ricc2
-    # ORCA TDDFT
-    elif is_orca(text):
-        return orca.parse_tddft
+    """Determine the parser for the given log buffer.
+
+    Only the header of the log is searched at first. The whole log is only
+    searched when the program can't be determined from the header."""
+    header = text[:HEADER_SIZE]
+    for search_text in (header, text):
+        # TURBOMOLE escf
+        if is_turbomole_escf(search_text):
+            return turbo.parse_escf
+        # TURBOMOLE ricc2
+        elif is_turbomole_ricc2(search_text):
+            return turbo.parse_ricc2
+        # ORCA TDDFT
+        elif is_orca(search_text):
+            return orca.parse_tddft
+        elif is_gaussian(search_text):
+            return gaussian.parse_tddft
     # Assume Gaussian otherwise
-    else:
-        return gaussian.parse_tddft
+    return gaussian.parse_tddft
 
 
 def logs_completer(prefix, **kwargs):
@@ -119,12 +144,12 @@ def parse_args(args):
     sorting_group.add_argument("--se", action="store_true",
                                help="Sort by energy.")
 
-    parser.add_argument("--start-mos", dest="start_mos", type=str, nargs="+",
+    parser.add_argument("--start-mos", dest="start_mos", type=int, nargs="+",
                         help="Show only transitions from this MO.")
-    parser.add_argument("--final-mos", dest="final_mos", type=str, nargs="+",
+    parser.add_argument("--final-mos", dest="final_mos", type=int, nargs="+",
                         help="Show only transitions to this MO.")
     parser.add_argument("--start-final-mos", dest="start_final_mos",
-                        type=str, nargs="+", help="(Number of) MO pair(s). "
+                        type=int, nargs="+", help="(Number of) MO pair(s). "
                         "Only transitions from [start mo] to [final mo] "
                         "are shown.")
     parser.add_argument("--raw", action="store_true",
@@ -139,6 +164,20 @@ def parse_args(args):
     parser.add_argument("--spectrum", dest="spectrum", action="store_true",
                         help="Calculate the UV spectrum from the TD "
                         "calculation (FWHM = 0.4 eV).")
+    parser.add_argument("--lineshape", dest="line_shape", choices=LINE_SHAPES,
+                        default="gauss",
+                        help="Line shape used for broadening.")
+    parser.add_argument("--width", type=float, default=WIDTH,
+                        help="Band width in eV, given as the 1/e half width "
+                        "of the gaussian. The lorentzian has the same FWHM.")
+    parser.add_argument("--eta", type=float, default=ETA,
+                        help="Lorentzian fraction of the pseudo-Voigt "
+                        "profile.")
+    parser.add_argument("--state-width", dest="state_widths", nargs=2,
+                        action="append", metavar=("ID", "WIDTH"),
+                        help="Use a different band width in eV for the "
+                        "state with the given id. May be given multiple "
+                        "times.")
     parser.add_argument("--savenm", action="store_true",
                         help="Export convoluted spectrum in nm.")
     parser.add_argument("--e2f", dest="e2f", action="store_true",
@@ -168,6 +207,16 @@ def parse_args(args):
                         help="Split the output in chunks. Useful for "
                         "investigating excited state optimizations. Don't use "
                         "with --sf or --raw.")
+    step_group = parser.add_mutually_exclusive_group()
+    step_group.add_argument("--last", dest="step", action="store_const",
+                            const=-1,
+                            help="Only parse the last TD calculation of a "
+                            "Gaussian or ORCA log, e.g. of an excited state "
+                            "optimization.")
+    step_group.add_argument("--step", type=int,
+                            help="Only parse the K-th TD calculation of a "
+                            "Gaussian or ORCA log, counted from 1. Negative "
+                            "values count from the end.")
     parser.add_argument("--docx", action="store_true",
                         help="Output the parsed data as a table into a "
                         ".docx document.")
@@ -190,9 +239,11 @@ def parse_args(args):
     parser.add_argument("--csv", action="store_true",
                         help="Export excited state data as .csv.")
     parser.add_argument("--boltzmann", nargs="+",
-                        help="Create a boltzmann averaged spectrum")
+                        help="Create a boltzmann averaged spectrum. It is "
+                             "written to 'boltzmann_eV.spec' and only "
+                             "plotted when --plot is given.")
     # Plotting related arguments
-    parser.add_argument("--plot", choices=["eV", "nm"],
+    parser.add_argument("--plot", choices=["eV", "nm", "cm-1"],
                         help="Plot the spectrum with matplotlib.")
     parser.add_argument("--peaks", action="store_true", default=False,
                         help="Detect peaks.")
@@ -201,61 +252,182 @@ def parse_args(args):
     parser.add_argument("--plotalso", nargs="+",
                         help="Also plot these spectra.")
     parser.add_argument("--fmax", type=float)
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="Number of processes used to parse the logs "
+                             "given with --boltzmann or --plotalso. 0 uses "
+                             "all available CPUs.")
+    # Cache related arguments
+    parser.add_argument("--no-cache", dest="no_cache", action="store_true",
+                        help="Don't use the on-disk cache of parsed logs.")
+    parser.add_argument("--cache-stats", dest="cache_stats",
+                        action="store_true",
+                        help="Print statistics of the on-disk cache of "
+                             "parsed logs and exit.")
 
     # Use the argcomplete module for autocompletion if it's available
     if "argcomplete" in sys.modules:
-        parser.add_argument("file_name", metavar="fn",
+        parser.add_argument("file_name", metavar="fn", nargs="?",
                             help="File to parse.").completer = logs_completer
         argcomplete.autocomplete(parser)
     else:
-        parser.add_argument("file_name", metavar="fn",
+        parser.add_argument("file_name", metavar="fn", nargs="?",
                             help="File to parse.")
-    return parser.parse_args(args)
+    parsed_args = parser.parse_args(args)
+    # The file name is only optional when printing the cache statistics
+    if (parsed_args.file_name is None) and not parsed_args.cache_stats:
+        parser.error("the following arguments are required: fn")
+    if parsed_args.step == 0:
+        parser.error("--step counts from 1, or from -1 at the end")
+    return parsed_args
+
+
+def parse_log(args, fn):
+    """Parse the excited states and, if requested, the NTOs and the ground
+    state energy from a log.
+
+    Unless disabled with --no-cache the results are looked up in and stored
+    into the on-disk cache. Messages printed or logged while parsing are
+    stored along with them, so they are also shown for cached results."""
+    with open_log(fn) as text:
+        parser = get_parser(fn, text)
+        if args.step is not None:
+            return parse_log_step(args, text, parser)
+        cache = None
+        parsed = None
+        if not args.no_cache:
+            cache = LogCache()
+            key = cache.key(fn, text)
+            parsed = cache.load(key)
+        cache_updated = parsed is None
+        if parsed is None:
+            if args.ntos and (parser is orca.parse_tddft):
+                # States and NTOs are collected in the same scan
+                (excited_states, ntos), messages = record_messages(
+                    orca.parse_tddft_ntos, text
+                )
+                parsed = {"excited_states": excited_states, "ntos": ntos}
+            else:
+                excited_states, messages = record_messages(parser, text)
+                parsed = {"excited_states": excited_states, }
+            parsed["messages"] = messages
+        replay_messages(parsed["messages"])
+        if (args.ntos and (parser is orca.parse_tddft)
+            and ("ntos" not in parsed)):
+            parsed["ntos"] = orca.parse_ntos(text)
+            cache_updated = True
+        if args.boltzmann and ("gs_energy" not in parsed):
+            parsed["gs_energy"] = orca.parse_final_sp_energy(text)
+            cache_updated = True
+        if (cache is not None) and cache_updated:
+            cache.store(key, parsed)
+    return parsed
+
+
+def parse_log_step(args, text, parser):
+    """Parse only one TD calculation of a log. The log is searched from the
+    end for negative steps, so this is not cached.
+
+    The ground state energy is taken from the selected calculation."""
+    # Part of the log holding the ground state energy
+    energy_bounds = ()
+    try:
+        if parser is gaussian.parse_tddft:
+            parsed = {"excited_states": gaussian.parse_tddft_step(text,
+                                                                  args.step)}
+        elif parser is orca.parse_tddft:
+            offsets = orca.step_offsets(text, args.step)
+            start, table, end = offsets
+            if args.ntos:
+                # Limited to the NTO blocks of this step
+                excited_states, ntos = orca.parse_tddft_ntos(text, offsets)
+                parsed = {"excited_states": excited_states, "ntos": ntos}
+            else:
+                block = text[start:end]
+                parsed = {"excited_states": orca.parse_tddft(block)}
+            energy_bounds = (table, end)
+        else:
+            sys.exit("--last and --step are only supported for Gaussian and "
+                     "ORCA logs.")
+    except StepNotFoundError as err:
+        sys.exit(err)
+    if args.boltzmann:
+        parsed["gs_energy"] = orca.parse_final_sp_energy(text, *energy_bounds)
+    return parsed
 
 
 def read_spectrum(args, fn):
-    with open(fn) as handle:
-        text = handle.read()
-    parser = get_parser(fn, text)
-    excited_states = parser(text)
+    parsed = parse_log(args, fn)
+    excited_states = parsed["excited_states"]
     if args.ntos:
         print("ntos", args.ntos)
-        if is_orca(text):
-            ntos = orca.parse_ntos(text)
-        else:
+        try:
+            ntos = parsed["ntos"]
+        except KeyError:
             ntos = load_nto_yaml()
         excited_states = set_ntos(excited_states, ntos)
-    gs_energy = None
-    if args.boltzmann:
-        gs_energy = orca.parse_final_sp_energy(text)
+    gs_energy = parsed.get("gs_energy", None)
 
     logging.warning("Only the contribution in % gets corrected, "
                     "for back-excitations, not the CI-coefficient."
     )
 
     for exc_state in excited_states:
-        exc_state.calculate_contributions()
-        exc_state.correct_backexcitations()
-        exc_state.suppress_low_ci_coeffs(args.ci_coeff)
-        exc_state.update_irreps()
+        exc_state.process_mo_transitions(args.ci_coeff)
 
     name = os.path.splitext(fn)[0]
 
-    return Spectrum(name, excited_states, gs_energy=gs_energy)
-
-
-def boltzmann_averaging(spectra, temperature=293.15):
+    spectrum = Spectrum(name, excited_states, gs_energy=gs_energy)
+    set_line_shape(spectrum, args)
+    return spectrum
+
+
+def set_line_shape(spectrum, args):
+    spectrum.line_shape = args.line_shape
+    spectrum.eta = args.eta
+    spectrum.width = args.width
+    if args.state_widths:
+        state_widths = {int(id_): float(width)
+                        for id_, width in args.state_widths}
+        spectrum.width = np.array([state_widths.get(es.id, args.width)
+                                   for es in spectrum.excited_states])
+
+
+def read_spectra(args, fns):
+    """Read several spectra, in parallel when requested with --jobs.
+
+    The spectra are returned in the order of 'fns'."""
+    jobs = args.jobs if args.jobs > 0 else os.cpu_count()
+    jobs = min(jobs, len(fns))
+    if jobs <= 1:
+        return [read_spectrum(args, fn) for fn in fns]
+    worker = functools.partial(read_spectrum, args)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+        return list(pool.map(worker, fns))
+
+
+def boltzmann_averaging(spectra, temperature=293.15, grid_eV=None,
+                        line_shape=None, width=None, eta=None):
+    """Boltzmann average of several spectra, weighted by their ground state
+    energies.
+
+    All spectra are broadened in one pass on a shared, uniform energy grid.
+    If no grid is given it spans the wavelength ranges of all spectra with
+    a step of BOLTZMANN_STEP eV. The line shape, width and eta are passed
+    on to broaden_ensemble() and default to those set on the spectra,
+    e.g. by set_line_shape(). Returns the averaged spectrum as an array
+    of shape (2, grid points) and the weighted spectra of all conformers
+    with shape (len(spectra), grid points)."""
     gs_energies = np.array([spectrum.gs_energy for spectrum in spectra],
                            dtype=np.float64)
     gs_energies -= gs_energies.min()
     gs_energies_joule = gs_energies * 4.35974465e-18
 
-    # Use the same nanometer range for all spectra
-    nm_ranges = np.array([spectrum.nm_range for spectrum in spectra])
-    nm_min = nm_ranges[:,0].min()
-    nm_max = nm_ranges[:,1].max()
-    for spectrum in spectra:
-        spectrum.nm_range = np.array((nm_min, nm_max))
+    # Use the same energy grid for all spectra
+    if grid_eV is None:
+        nm_ranges = np.array([spectrum.nm_range for spectrum in spectra])
+        eV_min = NM2EV / nm_ranges[:,1].max()
+        eV_max = NM2EV / nm_ranges[:,0].min()
+        grid_eV = np.arange(eV_min, eV_max, BOLTZMANN_STEP)
 
     # kT
     # k = 1.38064852 × 10-23 J/K
@@ -263,59 +435,77 @@ def boltzmann_averaging(spectra, temperature=293.15):
     # Determine weights
     weights = np.exp(-gs_energies_joule / kT)
     weights /= sum(weights)
-    spec_eV, osc_eV = zip(*[spectrum.eV for spectrum in spectra])
-    spec_eV = np.array(spec_eV)
-    all_ys = spec_eV[:,:,1] * weights[:,None]
-    ys = all_ys.sum(axis=0)
-    xs = spec_eV[0,:,0]
-    spec = np.stack((xs, ys))
+    broadened = broaden_ensemble(spectra, grid_eV, line_shape, width, eta)
+    ys = weights @ broadened
+    all_ys = broadened * weights[:,None]
+    spec = np.stack((grid_eV, ys))
+    return spec, all_ys
+
+
+def plot_boltzmann(spec, all_ys, temperature=293.15, unit="eV"):
+    """Plot the Boltzmann averaged spectrum and the weighted spectra of
+    all conformers, given on an energy grid in eV, against 'unit'."""
+    import matplotlib.pyplot as plt
 
     fig, ax = plt.subplots()
-    fig.suptitle(f"{len(spectra)} spectra, Boltzmann average, T = {temperature} K")
+    fig.suptitle(f"{len(all_ys)} spectra, Boltzmann average, "
+                 f"T = {temperature} K")
+    xs = from_eV(spec[0], unit)
     for y in all_ys:
         ax.plot(xs, y)
-    ax.plot(*spec)
-    ax.set_xlabel("E / eV")
+    ax.plot(xs, spec[1])
+    ax.set_xlabel(f"E / {unit}")
     ax.set_ylabel("ε / l mol⁻¹ cm⁻¹")
     #fig.tight_layout()
     plt.show()
-    return fig, ax, spec
+    return fig, ax
 
 
+@handle_broken_pipe
 def run():
     args = parse_args(sys.argv[1:])
 
+    if args.cache_stats:
+        LogCache().print_stats()
+        return
+
     logging.info("Only considering transitions  with "
                  "CI-coefficients >= {}:".format(args.ci_coeff))
 
     try:
         mo_data_fn = "mos.json"
         with open(mo_data_fn) as handle:
+            import simplejson as json
             json_data = json.load(handle)
 
+        # Keyed like MOTransition.start_tpl() and final_tpl()
         verbose_mos = dict()
         for key in json_data:
             mo, irrep = key.split()
-            #mo = int(mo)
-            verbose_mos[(mo, irrep)] = json_data[key]
+            verbose_mos[(int(mo), irrep)] = json_data[key]
     except IOError:
         logging.warning("Couldn't find verbose MO-names"
                         " in mos.json")
         verbose_mos = None
 
     if args.boltzmann:
-        spectra = [read_spectrum(args, fn) for fn in args.boltzmann]
-        boltz_spectrum = boltzmann_averaging(spectra)
+        spectra = read_spectra(args, args.boltzmann)
+        # The line shape and the widths were set by read_spectrum()
+        boltz_spectrum, all_ys = boltzmann_averaging(spectra)
+        boltz_fn = "boltzmann_eV.spec"
+        np.savetxt(boltz_fn, boltz_spectrum.T)
+        logging.info(f"Wrote Boltzmann averaged spectrum to {boltz_fn}.")
+        if args.plot:
+            plot_boltzmann(boltz_spectrum, all_ys, unit=args.plot)
         return
 
     fn = args.file_name
     fn_root = os.path.splitext(fn)[0]
-    spectrum = read_spectrum(args, fn)
-    excited_states = spectrum.excited_states
-
-    also_spectra = list()
+    fns = [fn, ]
     if args.plotalso:
-        also_spectra = [read_spectrum(args, fn) for fn in args.plotalso]
+        fns.extend(args.plotalso)
+    spectrum, *also_spectra = read_spectra(args, fns)
+    excited_states = spectrum.excited_states
 
     if args.nosym:
         for es in excited_states:
@@ -332,6 +522,8 @@ def run():
         spectrum.plot_nm(title=args.file_name, with_peaks=args.peaks)
     """
     if args.plot:
+        from td.SpectraPlotter import SpectraPlotter
+
         spectra = [spectrum, ]
         spectra.extend(also_spectra)
         plotter = SpectraPlotter(spectra, unit=args.plot, peaks=args.peaks,
@@ -342,8 +534,7 @@ def run():
     if args.by_id:
         try:
             exc_state = excited_states[args.by_id-1]
-            print_table([exc_state, ])
-            exc_state.print_mo_transitions(verbose_mos)
+            print_summary([exc_state, ], verbose_mos, end="\n")
         except IndexError:
             print("Excited state with id #{} not found.".format(args.by_id))
         sys.exit()
@@ -361,71 +552,62 @@ def run():
         for exc_state in excited_states:
             exc_state.f = 0.0
 
+    if args.enoffset or args.zeroosc:
+        # The states were modified in place
+        spectrum.clear_cache()
+
     """
     !
     ! DO FILTERING/SORTING HERE
     !
     """
 
+    table = ExcitedStateTable.from_excited_states(excited_states)
+
+    mask = np.ones(len(table), dtype=bool)
     if args.irrep:
-        excited_states = [es for es in excited_states if es.spat == args.irrep]
+        mask &= table.spat_mask(args.irrep)
 
+    if args.start_mos or args.final_mos or args.start_final_mos:
+        mo_index = MOIndex.from_table(table)
     if args.start_mos:
-        states = set()
-        for start_mo in args.start_mos:
-            states.update([exc_state for exc_state in excited_states
-                           if start_mo in exc_state.get_start_mos()])
-        excited_states = states
+        mask &= mo_index.mask(mo_index.from_mos(args.start_mos))
     if args.final_mos:
-        states = set()
-        for final_mo in args.final_mos:
-            states.update([exc_state for exc_state in excited_states
-                           if final_mo in exc_state.get_final_mos()])
-        excited_states = states
+        mask &= mo_index.mask(mo_index.to_mos(args.final_mos))
     if args.start_final_mos:
         sf_mos = args.start_final_mos
         if (len(sf_mos) % 2) != 0:
             sys.exit("Need an even number of arguments for "
                      "--start-final-mos, not an odd number.")
-        states = set()
-        pairs = [(sf_mos[i], sf_mos[i+1]) for i in range(len(sf_mos) / 2)]
-        for start_mo, final_mo in pairs:
-            states.update(
-                [exc_state for exc_state in excited_states if
-                 exc_state.has_mo_transition(start_mo, final_mo)]
-            )
-        excited_states = states
+        pairs = list(zip(sf_mos[::2], sf_mos[1::2]))
+        mask &= mo_index.mask(mo_index.with_pairs(pairs))
+    table = table[mask]
 
     # Sort by oscillator strength if requested.
     if args.sf:
-        excited_states = sorted(excited_states,
-                                key=lambda exc_state: -exc_state.f)
+        table = table[table.argsort_f()]
     # Sort by energy if requested.
     if args.se:
-        excited_states = sorted(excited_states,
-                                key=lambda es: -es.l)
-    for i, es in enumerate(excited_states, 1):
-        es.id_sorted = i
+        table = table[table.argsort_l()]
+    table.update_id_sorted()
 
     # Only show excitations in specified wavelength-range
     if args.range:
         # Only lower threshold specified (energy wise)
-        if len(args.range) is 1:
+        if len(args.range) == 1:
             end = args.range[0]
-            excited_states = [exc_state for exc_state in excited_states
-                              if (exc_state.l >= end)]
-        elif len(args.range) is 2:
+            table = table[table.range_mask(start=end)]
+        elif len(args.range) == 2:
             start, end = args.range
-            excited_states = [exc_state for exc_state in excited_states
-                              if (start <= exc_state.l <= end)]
+            table = table[table.range_mask(start, end)]
         else:
             raise Exception("Only 1 or 2 arguments allowed for --range!")
 
     if args.fthresh:
-        excited_states = [exc_state for exc_state in excited_states
-                          if (exc_state.f >= args.fthresh)]
+        table = table[table.f_mask(args.fthresh)]
 
-    excited_states = list(excited_states)[:args.show]
+    table = table[:args.show]
+    excited_states = table.excited_states
 
     """
     !
@@ -446,10 +628,6 @@ def run():
         mos = set(min_max_mos[irrep])
         min_max_mos[irrep] = (min(mos), max(mos))
 
-    # Convert remaining excitations to a list so it can be printed by
-    # the tabulate module
-    as_list = [exc_state.as_list() for exc_state in excited_states]
-
     """
     !
     ! PRINTING BELOW THIS LINE
@@ -472,11 +650,15 @@ def run():
         in_nm, osc_nm = spectrum.nm
         in_eV, osc_eV = spectrum.eV
         if args.norm or (args.norm == 0):
+            # The broadened spectra are cached and read-only
+            in_nm = in_nm.copy()
+            in_eV = in_eV.copy()
             peak_inds = spectrum.get_peak_inds(in_nm)[args.norm]
             nm_peaks = in_nm[peak_inds]
-            eV_peaks = in_eV[peak_inds]
+            # The eV spectrum is calculated on its own grid, so normalize
+            # it to ε of the same peak.
             in_nm[:,2] = in_nm[:,1] / nm_peaks[1]
-            in_eV[:,2] = in_eV[:,1] / eV_peaks[1]
+            in_eV[:,2] = in_eV[:,1] / nm_peaks[1]
         out_fns = ["nm.spec", "osc_nm.spec", "eV.spec", "osc_eV.spec"]
         for out_fn, spec in zip(out_fns, (in_nm, osc_nm, in_eV, osc_eV)):
             np.savetxt(out_fn, spec)
@@ -488,18 +670,15 @@ def run():
     # Dont print the pretty table when raw output is requested
     # Don't print anything after the summary
     if args.raw:
-        for exc_state in as_list:
-            print("\t".join([str(item) for item in exc_state]))
+        for exc_state in excited_states:
+            print("\t".join([str(item) for item in exc_state.as_list()]))
     elif args.chunks > 0:
         for i, chunk in enumerate(chunks(excited_states, args.chunks), 1):
             print("### Chunk {} ###".format(i))
             print_table(chunk)
             print()
     elif args.summary:
-        for exc_state in excited_states:
-            print_table([exc_state, ])
-            exc_state.print_mo_transitions(verbose_mos)
-            print("")
+        print_summary(excited_states, verbose_mos)
     elif args.booktabs:
         as_booktabs(excited_states)
     else:
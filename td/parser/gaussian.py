@@ -4,42 +4,56 @@
 import re
 
 from td.ExcitedState import ExcitedState
-from td.helper_funcs import conv
+from td.helper_funcs import as_buffer, conv, decode, find_block, iter_lines
 
 # Excitation energies and oscillator strengths
 # Groups: id, spin symm, spat symm, dE, wavelength, osc. strength, S**2
-EXC_LINE = "Excited State\s+(\d+):\s+([\w\.]+)-([\?\w'\"]+)\s+([0-9\.-]+) eV" \
-           "\s+([0-9\.-]+) nm\s+f=([0-9\.-]+)\s+<S\*\*2>=([0-9\.]+)"
+EXC_LINE = r"Excited State\s+(\d+):\s+([\w\.]+)-([\?\w'\"]+)\s+" \
+           r"([0-9\.-]+) eV\s+([0-9\.-]+) nm\s+" \
+           r"f=([0-9\.-]+)\s+<S\*\*2>=([0-9\.]+)"
+EXC_LINE_RE = re.compile(EXC_LINE.encode())
 # ExcitedStates between MOs and corresponding CI-coefficients
 # Groups: initial MO, final MO, ci coeffcient
 TRS_LINE = r"([\dAB]+)\s*(->|<-)\s*([\dAB]+)\s*\s+([0-9\.-]+)"
+TRS_LINE_RE = re.compile(TRS_LINE.encode())
+CHARGE_MULT_RE = re.compile(
+    r"\s*".join(r"Charge = ([\+\-\d]+) Multiplicity = (\d+)".split()).encode()
+)
+MO_NUM_RE = re.compile(r"(\d+)")
+# Heading of the excited states of every TD calculation in a log
+TDDFT_MARKER = b"Excitation energies and oscillator strengths:"
 
 
-def parse_tddft(text):
-    # Determine multiplicity
-    charge_mult_re = "\s*".join("Charge = ([\+\-\d]+) Multiplicity = (\d+)".split())
-    _, mult = re.search(charge_mult_re, text).groups()
-    mult = int(mult)
-    assert(mult >= 1)
+def handle_mo_item(mo_item):
+    _, mo_num, spin = MO_NUM_RE.split(mo_item)
+    if not spin:
+        spin = "a"
+    return mo_num, spin
 
-    lines = text.split("\n")
+
+def parse_tddft(text, mult=None):
+    """Parse the excited states from a Gaussian log.
+
+    'text' may be the whole log as a string or buffer (bytes, mmap) or any
+    iterable yielding its lines, e.g. an open file handle. The log is
+    processed line by line, so the memory usage does not grow with the
+    size of the log. Unless 'mult' is given the multiplicity is taken
+    from the first charge/multiplicity line."""
     excited_states = list()
 
     matched_exc_state = False
-    for line in lines:
+    for line in iter_lines(text):
         line = line.strip()
         # look for initial and final MO and corresponding CI-coefficient
         if matched_exc_state:
-            match_obj = re.match(TRS_LINE, line)
+            if (b"->" in line) or (b"<-" in line):
+                match_obj = TRS_LINE_RE.match(line)
+            else:
+                match_obj = None
             if match_obj:
-                group_list = list(match_obj.groups())
+                group_list = decode(match_obj.groups())
                 start_mo, to_or_from, final_mo, ci_coeff = conv(group_list,
                                                                 "sssf")
-                def handle_mo_item(mo_item):
-                    _, mo_num, spin = re.split("(\d+)", mo_item)
-                    if not spin:
-                        spin = "a"
-                    return mo_num, spin
                 start_mo = start_mo.lower()
                 final_mo = final_mo.lower()
                 start_mo_num, start_spin = handle_mo_item(start_mo)
@@ -50,14 +64,38 @@ def parse_tddft(text):
                                                  start_spin=start_spin,
                                                  final_spin=final_spin)
             # stop this matching if a blank line is encountered
-            if line.strip() == "":
+            if line == b"":
                 matched_exc_state = False
             continue
-        m_obj = re.match(EXC_LINE, line)
-        if m_obj:
-            excited_state = ExcitedState(*conv(m_obj.groups(), "issffff"))
-            excited_state.mult = mult
-            excited_states.append(excited_state)
-            matched_exc_state = True
+        if line.startswith(b"Excited State"):
+            m_obj = EXC_LINE_RE.match(line)
+            if m_obj:
+                groups = decode(m_obj.groups())
+                excited_state = ExcitedState(*conv(groups, "issffff"))
+                excited_states.append(excited_state)
+                matched_exc_state = True
+        # Determine multiplicity from the first charge/multiplicity line
+        elif (mult is None) and (b"Multiplicity" in line):
+            m_obj = CHARGE_MULT_RE.search(line)
+            if m_obj:
+                mult = int(m_obj.groups()[1])
+                assert(mult >= 1)
+
+    if mult is None:
+        raise Exception("Could not determine the multiplicity!")
+    for excited_state in excited_states:
+        excited_state.mult = mult
 
     return excited_states
+
+
+def parse_tddft_step(text, step):
+    """Parse only the excited states of one TD calculation, e.g. of one
+    step of an excited state optimization. See find_block() for 'step'."""
+    text = as_buffer(text)
+    start, end = find_block(text, TDDFT_MARKER, step)
+    m_obj = CHARGE_MULT_RE.search(text, 0, start)
+    if m_obj is None:
+        raise Exception("Could not determine the multiplicity!")
+    mult = int(m_obj.groups()[1])
+    return parse_tddft(text[start:end], mult=mult)
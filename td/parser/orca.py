@@ -3,79 +3,252 @@
 
 import re
 
+import numpy as np
+
 from td.constants import EV2NM
-from td.helper_funcs import FLOAT_RE
+from td.helper_funcs import FLOAT_RE, as_buffer, find_block
 from td.ExcitedState import ExcitedState
 
+# Headings of the blocks that are parsed. Transition electric dipole
+# moments are used for the absorption spectrum.
+TABLE_HEADING = b"VIA TRANSITION ELECTRIC DIPOLE MOMENTS"
+HEADING_RES = {
+    "state": re.compile(rb"STATE\s*\d+:\s*E="),
+    "table": re.compile(re.escape(TABLE_HEADING)),
+    "nto": re.compile(rb"NATURAL TRANSITION ORBITALS FOR STATE"),
+}
+# The absorption table ends with an empty line or at the heading of the
+# next table
+TABLE_END_RE = re.compile(rb"(?<=\n)[ \t]*\n|-\s*A")
+# Columns: id, energy in cm⁻¹, wavelength, osc. strength
+ABS_ROW_RE = re.compile(
+    r"\s*".join((r"(\d+)", FLOAT_RE, FLOAT_RE, FLOAT_RE, ".+\n")).encode()
+)
+# Groups: start MO, start spin, final MO, final spin, weight, ci coefficient
+MOC_RE = re.compile(
+    r"\s*".join((r"(\d+)(a|b)", "->", r"(\d+)(a|b)", ":", FLOAT_RE, r"\(c=",
+                 FLOAT_RE)).encode()
+)
+NTO_STATE_RE = re.compile(rb"STATE\s*(\d+)")
+NTO_HEAD_RE = re.compile(rb".+?-+", re.DOTALL)
+# Groups: from NTO, from spin, to NTO, to spin, weight
+NTO_CONTRIB_RE = re.compile(
+    rb"(\d+)([ab])\s*->\s*(\d+)([ab])\s*:\s*n=\s*([\d\.]+)"
+)
+
+
+def scan_tddft(text, states=True, ntos=False):
+    """Collect the absorption tables and the STATE blocks and/or the
+    offsets of the NTO blocks of an ORCA log in one forward pass.
+
+    The scan jumps from one block heading to the next and every block is
+    only searched up to its end, instead of running several searches over
+    the whole log.
+
+    Only the first absorption table of every calculation is used, like
+    the spectrum of the TDDFT states. Further tables, e.g. the spin-orbit
+    corrected spectrum, aren't preceded by STATE blocks and are skipped.
+
+    Returns a list with a (table rows, STATE blocks) tuple for every
+    calculation, where the STATE blocks are those printed since the
+    previous table, and a list with the (start, end) byte offsets of
+    every NTO block."""
+    text = as_buffer(text)
+    tables = list()
+    nto_blocks = list()
+    state_blocks = list()
+    kinds = list()
+    if states:
+        kinds.extend(("state", "table"))
+    if ntos:
+        kinds.append("nto")
+    # Next heading of every kind. Each kind is searched with its own regex,
+    # as these find their literal prefix much faster than one alternation.
+    headings = {kind: HEADING_RES[kind].search(text) for kind in kinds}
+    pos = 0
+    while True:
+        for kind, mobj in headings.items():
+            if (mobj is not None) and (mobj.start() < pos):
+                headings[kind] = HEADING_RES[kind].search(text, pos)
+        pending = [(mobj.start(), kind) for kind, mobj in headings.items()
+                   if mobj is not None]
+        if not pending:
+            break
+        _, kind = min(pending)
+        mobj = headings[kind]
+        start = mobj.end()
+        if kind == "state":
+            # A STATE block ends with the first empty line
+            end = text.find(b"\n\n", start)
+            if end == -1:
+                headings[kind] = None
+                continue
+            state_blocks.append(MOC_RE.findall(text, start, end))
+            pos = end + 2
+        elif kind == "table":
+            end_obj = TABLE_END_RE.search(text, start + 1)
+            end = end_obj.start() if end_obj else len(text)
+            if state_blocks or not tables:
+                tables.append((ABS_ROW_RE.findall(text, start, end),
+                               state_blocks))
+                state_blocks = list()
+            pos = end
+        else:
+            # The contributions follow the dashed line below the heading
+            # and end with the next dashed line.
+            head = NTO_HEAD_RE.match(text, start)
+            end = text.find(b"-----", head.end() + 1) if head else -1
+            if end == -1:
+                headings[kind] = None
+                continue
+            nto_blocks.append((mobj.start(), end + 5))
+            # The end of the last NTO block may lie behind other headings
+            pos = start
+    return tables, nto_blocks
 
-def parse_tddft(text):
-    # Use transition electric dipole moments
-    abs_re = "VIA TRANSITION ELECTRIC DIPOLE MOMENTS(.+?)-\s*A"
-    abs_text = re.search(abs_re, text, re.DOTALL).groups()[0]
-    line_re = ("(\d+)", FLOAT_RE, FLOAT_RE, FLOAT_RE, ".+\n")
-    line_re = "\s*".join(line_re)
-    states = re.findall(line_re, abs_text)
-    states = [(int(id), float(l), float(f)) for id, ecm, l, f in states]
-
-    states_moc_re = "STATE\s*\d+:\s*E=(.+?)\n\n"
-    states_moc = re.findall(states_moc_re, text, re.DOTALL)
-    assert(len(states) == len(states_moc))
 
+def parse_table_rows(rows):
+    """Convert the rows of an absorption table at once.
+
+    Returns the state ids, wavelengths and oscillator strengths."""
+    if not rows:
+        return list(), list(), list()
+    table = np.array(rows, dtype=float)
+    ids = table[:, 0].astype(int)
+    return ids.tolist(), table[:, 2].tolist(), table[:, 3].tolist()
+
+
+def states_from_tables(tables):
+    """Create the excited states from the tables found by scan_tddft()."""
     excited_states = list()
-    moc_re = ("(\d+)(a|b)", "->", "(\d+)(a|b)", ":", FLOAT_RE, "\(c=",
-              FLOAT_RE)
-    moc_re = "\s*".join(moc_re)
     # No spatial symmetry in ORCA
     sym = "a"
     start_irrep = "a"
     final_irrep = "a"
     spin = "???"
     to_or_from = "->"
-    for (id, l, f), state_moc in zip(states, states_moc):
-        ee = EV2NM / l
-        exc_state = ExcitedState(id, spin, sym, ee, l, f, "???")
-        excited_states.append(exc_state)
-        mocs = re.findall(moc_re, state_moc)
-        for (start_mo, start_spin, final_mo, final_spin,
-             percent, coeff) in mocs:
-            start_mo = int(start_mo)
-            final_mo = int(final_mo)
-            percent = float(percent)
-            coeff = float(coeff)
-            exc_state.add_mo_transition(start_mo,
-                                        to_or_from,
-                                        final_mo,
-                                        ci_coeff=coeff,
-                                        contrib=percent,
-                                        start_spin=start_spin,
-                                        final_spin=final_spin,
-                                        start_irrep=start_irrep,
-                                        final_irrep=final_irrep)
-
+    for rows, states_moc in tables:
+        ids, ls, fs = parse_table_rows(rows)
+        assert(len(ids) == len(states_moc))
+        for id, l, f, mocs in zip(ids, ls, fs, states_moc):
+            ee = EV2NM / l
+            exc_state = ExcitedState(id, spin, sym, ee, l, f, "???")
+            excited_states.append(exc_state)
+            for (start_mo, start_spin, final_mo, final_spin,
+                 percent, coeff) in mocs:
+                start_mo = int(start_mo)
+                final_mo = int(final_mo)
+                percent = float(percent)
+                coeff = float(coeff)
+                exc_state.add_mo_transition(start_mo,
+                                            to_or_from,
+                                            final_mo,
+                                            ci_coeff=coeff,
+                                            contrib=percent,
+                                            start_spin=start_spin.decode(),
+                                            final_spin=final_spin.decode(),
+                                            start_irrep=start_irrep,
+                                            final_irrep=final_irrep)
     return excited_states
 
 
-def parse_nto_block(text):
-    state_re = "STATE\s*(\d+)"
-    state = int(re.search(state_re, text).groups()[0])
-    nto_contrib_re = "(\d+)([ab])\s*->\s*(\d+)([ab])\s*:\s*n=\s*([\d\.]+)"
-    nto_contribs = re.findall(nto_contrib_re, text)
-    nto_contribs = [(int(from_nto), from_spin,
-                     int(to_nto), to_spin,
+def parse_tddft(text):
+    """Parse the excited states from an ORCA log.
+
+    The log is scanned only once. Logs with several TDDFT calculations,
+    e.g. from optimizations, yield the states of all calculations."""
+    tables, _ = scan_tddft(text)
+    if not tables:
+        raise Exception("Couldn't find the absorption spectrum in the "
+                        "ORCA log!")
+    return states_from_tables(tables)
+
+
+def parse_nto_block(text, start=0, end=None):
+    """Parse the NTO block between the byte offsets start and end."""
+    if end is None:
+        end = len(text)
+    state = int(NTO_STATE_RE.search(text, start, end).groups()[0])
+    nto_contribs = [(int(from_nto), from_spin.decode(),
+                     int(to_nto), to_spin.decode(),
                      float(nto_weight))
                     for from_nto, from_spin, to_nto, to_spin, nto_weight
-                    in nto_contribs]
+                    in NTO_CONTRIB_RE.findall(text, start, end)]
     return state, nto_contribs
 
 
 def parse_ntos(text):
-    nto_block_re = "(NATURAL TRANSITION ORBITALS FOR STATE.+?-+.+?-----)"
-    nto_blocks = re.findall(nto_block_re, text, re.DOTALL)
-    parsed_nto_blocks = [parse_nto_block(ntob) for ntob in nto_blocks]
-    return parsed_nto_blocks
+    text = as_buffer(text)
+    _, nto_blocks = scan_tddft(text, states=False, ntos=True)
+    return [parse_nto_block(text, start, end) for start, end in nto_blocks]
+
+
+def parse_tddft_ntos(text, offsets=None):
+    """Parse the excited states and the NTOs with a single scan.
+
+    If the byte offsets (start, table, end) of one TDDFT calculation are
+    given, see step_offsets(), only this calculation is parsed. Its NTO
+    blocks are printed before its table, so the NTO blocks behind the
+    table, which belong to the next calculation, are skipped.
+
+    Returns the excited states and the parsed NTO blocks."""
+    text = as_buffer(text)
+    nto_end = None
+    if offsets is not None:
+        start, table, end = offsets
+        text = text[start:end]
+        nto_end = table - start
+    tables, nto_blocks = scan_tddft(text, ntos=True)
+    if not tables:
+        raise Exception("Couldn't find the absorption spectrum in the "
+                        "ORCA log!")
+    ntos = [parse_nto_block(text, start, end) for start, end in nto_blocks
+            if (nto_end is None) or (end <= nto_end)]
+    return states_from_tables(tables), ntos
+
+
+def first_table(text, start):
+    """Whether the absorption table at 'start' is the first one of its
+    calculation, see scan_tddft()."""
+    prev_table = text.rfind(TABLE_HEADING, 0, start)
+    if prev_table == -1:
+        return True
+    return HEADING_RES["state"].search(text, prev_table, start) is not None
+
+
+def step_offsets(text, step):
+    """Byte offsets (start, table, end) of one TDDFT calculation, e.g. of
+    one step of an excited state optimization. See find_block() for 'step'.
+
+    The calculation is located by its first absorption table at 'table' and
+    lasts until the first table of the next calculation. Its STATE and NTO
+    blocks are printed after the tables of the previous calculation, so
+    they start behind the heading of the previous table at 'start'."""
+    start, end = find_block(text, TABLE_HEADING, step, accept=first_table)
+    # Skip the heading of the previous table, so only its rows remain
+    prev_table = text.rfind(TABLE_HEADING, 0, start)
+    prev_end = 0 if prev_table == -1 else prev_table + len(TABLE_HEADING)
+    return prev_end, start, end
+
+
+def step_block(text, step):
+    """Part of the log holding only one TDDFT calculation, see
+    step_offsets()."""
+    text = as_buffer(text)
+    start, _, end = step_offsets(text, step)
+    return text[start:end]
+
+
+def parse_tddft_step(text, step):
+    """Parse only the excited states of one TDDFT calculation."""
+    return parse_tddft(step_block(text, step))
 
 
-def parse_final_sp_energy(text):
-    sp_energy_re = "FINAL SINGLE POINT ENERGY\s*([\d\-\.]+)"
-    sp_energy = float(re.search(sp_energy_re, text)[1])
+def parse_final_sp_energy(text, start=0, end=None):
+    """First final single point energy in text[start:end]."""
+    text = as_buffer(text)
+    if end is None:
+        end = len(text)
+    sp_energy_re = re.compile(rb"FINAL SINGLE POINT ENERGY\s*([\d\-\.]+)")
+    sp_energy = float(sp_energy_re.search(text, start, end)[1])
     return sp_energy
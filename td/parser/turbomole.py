@@ -4,37 +4,114 @@
 import logging
 import re
 
-import pyparsing as pp
-
 from td.constants import EV2NM, HARTREE2EV, HARTREE2NM
 from td.ExcitedState import ExcitedState
+from td.helper_funcs import decode, iter_lines
 
 
-def parse_ricc2(text):
-    num_sym_spin_re = "symmetry, multiplicity:\s*(\d+)\s*([\w\"\']+)\s*(\d+)"
-    ids_syms_spins = re.findall(num_sym_spin_re, text)
-    ids, syms, spins = zip(*ids_syms_spins)
+# Groups: id, symmetry, multiplicity
+RICC2_SYM_RE = re.compile(
+    rb"symmetry, multiplicity:\s*(\d+)\s*([\w\"\']+)\s*(\d+)"
+)
+RICC2_EE_RE = re.compile(rb"frequency\s*:.+?([\d\.]+)\s*e\.V\.")
+#RICC2_OSC_RE = re.compile(rb"\(mixed gauge\)\s*:\s*([\d\.]+)")
+RICC2_OSC_RE = re.compile(
+    rb"oscillator strength.+?length gauge\)\s*:\s*([\d\.]+)"
+)
+RICC2_CONTRIB_RE = re.compile(rb"occ\. orb\..+?\%\s*\|")
+COSMO_SUMMARY = b"SUMMARY OF RELAXED EXCITATIONS WITH COSMO"
+COSMO_HEADER = b"E(exc(OCC))/eV|"
+
+
+def split_contrib_lines(block_lines):
+    """Split the rows of a RICC2 MO contribution table into
+    (start MO, irrep, index, spin, final MO, irrep, index, spin, coeff, %).
+    The first and the last line hold the table borders."""
+    split_lines = [re.sub(r"[\|\(\)]", "",  mol.decode("utf-8")).split()
+                   for mol in block_lines[1:-1]]
+    for sl in split_lines:
+        if len(sl) == 8:
+            sl.insert(3, "a")
+            sl.insert(7, "a")
+    return split_lines
+
+
+def to_float(value):
+    try:
+        return float(value)
+    except ValueError:
+        return 0.
 
-    exc_energy_re = "frequency\s*:.+?([\d\.]+)\s*e\.V."
-    ees = [float(ee) for ee in re.findall(exc_energy_re, text)]
 
-    #osc_strength_re = "\(mixed gauge\)\s*:\s*([\d\.]+)"
-    osc_strength_re = "oscillator strength.+?length gauge\)\s*:\s*([\d\.]+)"
-    oscs = [float(osc) for osc in re.findall(osc_strength_re, text)]
+def parse_cosmo_rows(lines):
+    """Parse the rows of the COSMO summary table from the lines following
+    its header, up to the end of the table.
+
+    Every row is returned as [sym, multi, state, E(tot), E(diff),
+    E(exci), E(exc(OCC))/eV], missing values are set to 0."""
+    rows = list()
+    for line in lines:
+        line = line.strip()
+        # Separators between the rows
+        if line.startswith(b"+"):
+            continue
+        fields = line.strip(b"|").split(b"|")
+        if (not line.startswith(b"|")) or (len(fields) != 7):
+            break
+        sym, multi, state = [field.strip() for field in fields[:3]]
+        try:
+            row = [sym.decode("utf-8"), int(multi), int(state)]
+        except ValueError:
+            break
+        rows.append(row + [to_float(field) for field in fields[3:]])
+    return rows
+
+
+def parse_ricc2(text):
+    """Parse the excited states from a TURBOMOLE ricc2 log.
 
+    'text' may be the whole log as a string or buffer (bytes, mmap) or any
+    iterable yielding its lines, e.g. an open file handle. The states, the
+    MO contributions and the COSMO summary table are all collected in one
+    pass over the lines."""
+    ids_syms_spins = list()
+    ees = list()
+    oscs = list()
     mo_contribs = list()
-    mo_contrib_re = "occ\. orb\..+?\%\s*\|(.+?)\s*norm"
-    # Get the blocks containing the MO contributions for every state
-    mo_contrib_blocks = re.findall(mo_contrib_re, text, re.DOTALL)
-    for mcb in mo_contrib_blocks:
-        block_lines = mcb.strip().split("\n")[1:-1]
-        split_lines = [re.sub("[\|\(\)]", "",  mol).split()
-                       for mol in block_lines]
-        for sl in split_lines:
-            if len(sl) == 8:
-                sl.insert(3, "a")
-                sl.insert(7, "a")
-        mo_contribs.append(split_lines)
+    cosmo = False
+    cosmo_rows = None
+    # Lines of the current MO contribution table
+    block_lines = None
+    lines = iter_lines(text)
+    for line in lines:
+        if block_lines is not None:
+            if b"norm" in line:
+                mo_contribs.append(split_contrib_lines(block_lines))
+                block_lines = None
+            else:
+                block_lines.append(line)
+            continue
+        if b"symmetry, multiplicity:" in line:
+            mobj = RICC2_SYM_RE.search(line)
+            if mobj:
+                ids_syms_spins.append(decode(mobj.groups()))
+        elif b"frequency" in line:
+            mobj = RICC2_EE_RE.search(line)
+            if mobj:
+                ees.append(float(mobj.groups()[0]))
+        elif b"oscillator strength" in line:
+            mobj = RICC2_OSC_RE.search(line)
+            if mobj:
+                oscs.append(float(mobj.groups()[0]))
+        elif b"occ. orb." in line:
+            if RICC2_CONTRIB_RE.search(line):
+                block_lines = list()
+        elif COSMO_SUMMARY in line:
+            cosmo = True
+        elif (cosmo_rows is None) and (COSMO_HEADER in line):
+            # Consumes the lines of the table
+            cosmo_rows = parse_cosmo_rows(lines)
+    ids, syms, spins = zip(*ids_syms_spins)
 
     # When excited state properties are requested the lists
     # 'syms', 'spins', 'ees' will be twice as long as 'oscs'
@@ -47,7 +124,6 @@ def parse_ricc2(text):
         spins = spins[first_half]
         ees = ees[first_half]
 
-    #import pdb; pdb.set_trace()
     assert(len(syms) == len(spins) == len(ees) == len(oscs) ==
            len(mo_contribs))
 
@@ -71,9 +147,9 @@ def parse_ricc2(text):
                                         start_irrep=start_irrep,
                                         final_irrep=final_irrep)
 
-    if "SUMMARY OF RELAXED EXCITATIONS WITH COSMO" in text:
+    if cosmo:
         logging.warning("Using COSMO energies!")
-        lines = cosmo_ricc2 = parse_cosmo_ricc2(text)
+        lines = cosmo_rows or list()
 
         # Using E(exc(OCC)) / eV to update the energies,
         # skipping the GS (first line)
@@ -93,91 +169,107 @@ def parse_ricc2(text):
     return excited_states
 
 
-def parse_cosmo_ricc2(text):
-    def to_float(s, loc, toks):
-        try:
-            return float(toks[0])
-        except ValueError:
-            return 0.
-
-    float_ = pp.Word(pp.nums + ".-").setParseAction(to_float)
-    int_ = pp.Word(pp.nums).setParseAction(lambda t: int(t[0]))
-    big_sep = pp.Suppress(pp.Word("+="))
-    small_sep = pp.Suppress(pp.Word("+-"))
-    bar = pp.Suppress(pp.Literal("|"))
-    sym = pp.Word(pp.alphanums + "'" + '"' + "*")
-    multi = int_
-    state = int_
-    E_tot = float_
-    E_diff = float_
-    E_exci = float_
-    E_exc= float_
-    line = pp.Group(
-        bar + sym + bar + multi + bar + state + bar +
-        E_tot + bar + E_diff + bar + E_exci + bar + E_exc + bar
-    )
-
-    parser = (
-        pp.Suppress(pp.SkipTo("E(exc(OCC))/eV|", include=True))
-        + big_sep
-        + pp.OneOrMore(line + small_sep)
-    )
-
-
-    res = parser.parseString(text)
-    return res
+# In openshell calculations TURBOMOLE omits the multiplicity in the string.
+# Groups: id, spin, spatial symmetry
+ESCF_SYM_RE = re.compile(
+    rb"(\d+)\s+(singlet|doublet|triplet|quartet|quintet|sextet)?"
+    rb"\s*([\w'\"]+)\s+excitation"
+)
+ESCF_EE_RE = re.compile(rb"Excitation energy:\s*([\d\.E\+-]+)")
+ESCF_OSC_RE = re.compile(rb"mixed representation:\s*([\d\.E\+-]+)")
+# Groups: occ. MO, irrep, spin, energy, virt. MO, irrep, spin, energy, weight
+ESCF_DC_RE = re.compile(
+    rb"(\d+) ([\w'\"]+)\s*(beta|alpha)?\s+([-\d\.]+)\s*"
+    rb"(\d+) ([\w'\"]+)\s*(beta|alpha)?\s+([-\d\.]+)\s*"
+    rb"([\d\.]+)"
+)
+
+
+def escf_state(sym, ee, osc, dcs):
+    """Create an excited state from the data of one escf state block."""
+    id_, spin, spat = sym
+    for name, value in (("excitation energy", ee),
+                        ("oscillator strength", osc)):
+        if value is None:
+            raise Exception(f"Couldn't find the {name} of state {id_} "
+                            f"{spat} in the escf log!")
+    dE = ee * HARTREE2EV
+    l = HARTREE2NM / ee
+
+    exc_state = ExcitedState(id_, spin, spat, dE, l, osc, "???")
+    for d in dcs:
+        start_mo = d[0]
+        start_irrep = d[1]
+        start_spin = d[2]
+        final_mo = d[4]
+        final_irrep = d[5]
+        final_spin = d[6]
+        to_or_from = "->"
+        contrib = float(d[8]) / 100
+        exc_state.add_mo_transition(start_mo, to_or_from, final_mo,
+                                    ci_coeff=-0, contrib=contrib,
+                                    start_spin=start_spin,
+                                    final_spin=final_spin,
+                                    start_irrep=start_irrep,
+                                    final_irrep=final_irrep)
+    return exc_state
 
 
 def parse_escf(text):
-    # In openshell calculations TURBOMOLE omits the multiplicity in
-    # the string.
-    sym = "(\d+)\s+(singlet|doublet|triplet|quartet|quintet|sextet)?" \
-          "\s*([\w'\"]+)\s+excitation"
-    sym_re = re.compile(sym)
-    syms = sym_re.findall(text)
-    syms = [(int(id_), spin, spat) for id_, spin, spat in syms]
-
-    exc_energy = "Excitation energy:\s*([\d\.E\+-]+)"
-    exc_energy_re = re.compile(exc_energy)
-    ees = exc_energy_re.findall(text)
-    ees = [float(ee) for ee in ees]
-
-    osc_strength = "mixed representation:\s*([\d\.E\+-]+)"
-    osc_strength_re = re.compile(osc_strength)
-    oscs = osc_strength_re.findall(text)
-    oscs = [float(osc) for osc in oscs]
-
-    dom_contrib = "2\*100(.*?)Change of electron number"
-    dom_contrib_re = re.compile(dom_contrib, flags=re.MULTILINE | re.DOTALL)
-    dcs = dom_contrib_re.findall(text)
-    dc_str = "(\d+) ([\w'\"]+)\s*(beta|alpha)?\s+([-\d\.]+)\s*" \
-             "(\d+) ([\w'\"]+)\s*(beta|alpha)?\s+([-\d\.]+)\s*" \
-             "([\d\.]+)"
-    dc_re = re.compile(dc_str)
-    dcs_parsed = [dc_re.findall(exc) for exc in dcs]
+    """Parse the excited states from a TURBOMOLE escf log.
 
+    'text' may be the whole log as a string or buffer (bytes, mmap) or any
+    iterable yielding its lines, e.g. an open file handle. The log is read
+    in one pass and every state is created as soon as its block is read.
+    An exception is raised when a block lacks the excitation energy or
+    the oscillator strength, or holds one of them twice."""
     excited_states = list()
-    for sym, ee, osc, dc in zip(syms, ees, oscs, dcs_parsed):
-        id_, spin, spat = sym
-        dE = ee * HARTREE2EV
-        l = HARTREE2NM / ee
-
-        exc_state = ExcitedState(id_, spin, spat, dE, l, osc, "???")
-        excited_states.append(exc_state)
-        for d in dc:
-            start_mo = d[0]
-            start_irrep = d[1]
-            start_spin = d[2]
-            final_mo = d[4]
-            final_irrep = d[5]
-            final_spin = d[6]
-            to_or_from = "->"
-            contrib = float(d[8]) / 100
-            exc_state.add_mo_transition(start_mo, to_or_from, final_mo,
-                                        ci_coeff=-0, contrib=contrib,
-                                        start_spin=start_spin,
-                                        final_spin=final_spin,
-                                        start_irrep=start_irrep,
-                                        final_irrep=final_irrep)
+    # Data of the current state block
+    sym = None
+    ee = osc = None
+    dcs = list()
+    in_contribs = False
+    for line in iter_lines(text):
+        # Dominant contributions, between the table header ending in
+        # '|coeff.|^2*100' and the electron number change.
+        if in_contribs:
+            if b"Change of electron number" in line:
+                in_contribs = False
+            else:
+                mobj = ESCF_DC_RE.search(line)
+                if mobj:
+                    dcs.append(decode(mobj.groups(b"")))
+            continue
+        if b"excitation" in line:
+            mobj = ESCF_SYM_RE.search(line)
+            if mobj:
+                if sym is not None:
+                    excited_states.append(escf_state(sym, ee, osc, dcs))
+                id_, spin, spat = decode(mobj.groups(b""))
+                sym = (int(id_), spin, spat)
+                ee = None
+                osc = None
+                dcs = list()
+                continue
+        if sym is None:
+            continue
+        if b"Excitation energy:" in line:
+            mobj = ESCF_EE_RE.search(line)
+            if mobj:
+                if ee is not None:
+                    raise Exception("Found two excitation energies for "
+                                    f"state {sym[0]} {sym[2]}!")
+                ee = float(mobj.groups()[0])
+        elif b"mixed representation:" in line:
+            mobj = ESCF_OSC_RE.search(line)
+            if mobj:
+                if osc is not None:
+                    raise Exception("Found two oscillator strengths for "
+                                    f"state {sym[0]} {sym[2]}!")
+                osc = float(mobj.groups()[0])
+        elif b"2*100" in line:
+            in_contribs = True
+    if sym is not None:
+        excited_states.append(escf_state(sym, ee, osc, dcs))
 
     return excited_states
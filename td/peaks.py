@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+
+import numpy as np
+from scipy.ndimage import maximum_filter1d, minimum_filter1d
+
+
+def first_true(mask):
+    """Index of the first True entry in mask or None."""
+    ind = np.argmax(mask)
+    return ind if mask[ind] else None
+
+
+def find_peak(y, ahead, start, end, delta, search_max, search_min,
+              block_size=256):
+    """Next peak of a peakdetect() scan that restarted at 'start'.
+
+    Returns (is_max, peak index, index where the peak was confirmed) or None
+    when no further peak is found before 'end'. The running extrema are
+    calculated for growing blocks of points after 'start', so the cost
+    scales with the distance to the next peak."""
+    stop = min(start + block_size, end)
+    while True:
+        peak = find_peak_in(y, ahead, start, stop, delta, search_max,
+                            search_min)
+        if (peak is not None) or (stop == end):
+            return peak
+        stop = min(start + 2 * (stop - start), end)
+
+
+def find_peak_in(y, ahead, start, end, delta, search_max, search_min):
+    found = list()
+    if search_max:
+        y_ = y[start:end]
+        run_max = np.maximum.accumulate(y_)
+        ind = first_true((y_ < run_max - delta)
+                         & (ahead[0][start:end] < run_max))
+        if ind is not None:
+            # As in peakdetect() the max check comes first, so it wins
+            # when both peaks are confirmed at the same index.
+            found.append((start + ind, 0, True, run_max[ind]))
+    if search_min:
+        y_ = y[start:end]
+        run_min = np.minimum.accumulate(y_)
+        ind = first_true((y_ > run_min + delta)
+                         & (ahead[1][start:end] > run_min))
+        if ind is not None:
+            found.append((start + ind, 1, False, run_min[ind]))
+    if not found:
+        return None
+    confirmed, _, is_max, value = min(found)
+    # Position of the first occurrence of the extremum since 'start'
+    peak = start + np.flatnonzero(y[start:confirmed+1] == value)[0]
+    return is_max, peak, confirmed
+
+
+def detect_peaks_1d(y, x, ahead, lookahead, delta):
+    # Only detect peaks if there are 'lookahead' points after them
+    end = max(y.size - lookahead, 0)
+    max_peaks = list()
+    min_peaks = list()
+    dump = list()
+    start = 0
+    search_max = search_min = True
+    while start < end:
+        peak = find_peak(y, ahead, start, end, delta, search_max, search_min)
+        if peak is None:
+            break
+        is_max, peak_ind, confirmed = peak
+        peaks = max_peaks if is_max else min_peaks
+        peaks.append([x[peak_ind], y[peak_ind]])
+        dump.append(is_max)
+        # Alternate between maxima and minima, restarting after the point
+        # where the last peak was confirmed.
+        search_max = not is_max
+        search_min = is_max
+        start = confirmed + 1
+    # Remove the false hit on the first value of y, as peakdetect() does
+    if dump:
+        (max_peaks if dump[0] else min_peaks).pop(0)
+    return [max_peaks, min_peaks]
+
+
+def detect_peaks(y_axis, x_axis=None, lookahead=200, delta=0):
+    """Vectorized version of peakdetect.peakdetect().
+
+    Yields the same peaks for the same lookahead and delta. The sliding
+    maxima and minima over the next 'lookahead' points are calculated
+    for all points at once. The running extrema and the checks of the
+    original loop are evaluated with NumPy between two peaks, so Python
+    only loops over the peaks, not over the points.
+
+    y_axis may also be a 2d array holding one spectrum per row. Then a list
+    with the result of every row is returned.
+
+    Returns [max_peaks, min_peaks], both lists of [position, value]."""
+    y_axis = np.asarray(y_axis, dtype=float)
+    if lookahead < 1:
+        raise ValueError("Lookahead must be '1' or above in value")
+    if not (np.isscalar(delta) and delta >= 0):
+        raise ValueError("delta must be a positive number")
+    length = y_axis.shape[-1]
+    if x_axis is None:
+        x_axis = np.arange(length)
+    x_axis = np.asarray(x_axis)
+    if x_axis.size != length:
+        raise ValueError(
+                "Input vectors y_axis and x_axis must have same length")
+
+    y_2d = np.atleast_2d(y_axis)
+    # Max/min of y[i:i+lookahead] for every point i that is checked
+    origin = -(lookahead // 2)
+    aheads = [filter_(y_2d, lookahead, axis=-1, origin=origin)
+              for filter_ in (maximum_filter1d, minimum_filter1d)]
+    peaks = [detect_peaks_1d(y, x_axis, (ahead_max, ahead_min), lookahead,
+                             delta)
+             for y, ahead_max, ahead_min in zip(y_2d, *aheads)]
+    if y_axis.ndim == 1:
+        return peaks[0]
+    return peaks
@@ -5,7 +5,10 @@
 from __future__ import print_function
 from __future__ import unicode_literals
 from collections import namedtuple, Iterable
+from itertools import islice
 from platform import python_version_tuple
+import math
+import numbers
 import re
 
 
@@ -45,13 +48,17 @@ except ImportError:
     wcwidth = None
 
 
-__all__ = ["tabulate", "tabulate_formats", "simple_separated_format"]
+__all__ = ["tabulate", "tabulate_lines", "column_layout",
+           "tabulate_formats", "simple_separated_format"]
 __version__ = "0.7.6-dev"
 
 
 # minimum extra space in headers
 MIN_PADDING = 2
 
+# number of rows formatted at once by tabulate_lines()
+LINES_BATCH = 1000
+
 # if True, enable wide-character (CJK) support
 WIDE_CHARS_MODE = wcwidth is not None
 
@@ -471,6 +478,22 @@ def _afterpoint(string):
         return -1  # not a number
 
 
+def _afterpoint_typed(string):
+    """Like _afterpoint() for strings of formatted ints and floats.
+
+    >>> _afterpoint_typed("123.45"), _afterpoint_typed("1001")
+    (2, -1)
+    >>> _afterpoint_typed("123e45"), _afterpoint_typed("nan")
+    (2, -1)
+
+    """
+    pos = string.rfind(".")
+    pos = string.lower().rfind("e") if pos < 0 else pos
+    if pos >= 0:
+        return len(string) - pos - 1
+    return -1
+
+
 def _padleft(width, s):
     """Flush right.
 
@@ -530,9 +553,14 @@ def _visible_width(s):
         return len_fn(_text_type(s))
 
 
-def _align_column(strings, alignment, minwidth=0, has_invisible=True):
+def _align_column(strings, alignment, minwidth=0, has_invisible=True,
+                  typed=False, maxdecimals=None):
     """[string] -> [padded_string]
 
+    For `typed` columns the strings were formatted from values of a known
+    type, so the decimals are found without parsing the strings again.
+    Decimal aligned columns are aligned to `maxdecimals` decimals, if given.
+
     >>> list(map(str,_align_column(["12.345", "-1234.5", "1.23", "1234.5", "1e+234", "1.0e234"], "decimal")))
     ['   12.345  ', '-1234.5    ', '    1.23   ', ' 1234.5    ', '    1e+234 ', '    1.0e234']
 
@@ -547,11 +575,14 @@ def _align_column(strings, alignment, minwidth=0, has_invisible=True):
         strings = [s.strip() for s in strings]
         padfn = _padboth
     elif alignment == "decimal":
-        if has_invisible:
+        if typed:
+            decimals = [_afterpoint_typed(s) for s in strings]
+        elif has_invisible:
             decimals = [_afterpoint(_strip_invisible(s)) for s in strings]
         else:
             decimals = [_afterpoint(s) for s in strings]
-        maxdecimals = max(decimals)
+        if maxdecimals is None:
+            maxdecimals = max(decimals)
         strings = [s + (maxdecimals - decs) * " "
                    for s, decs in zip(strings, decimals)]
         padfn = _padleft
@@ -569,17 +600,21 @@ def _align_column(strings, alignment, minwidth=0, has_invisible=True):
     else:
         width_fn = len
 
+    if not enable_widechars and not has_invisible:
+        # Column width in one pass, as the width is just the length
+        maxwidth = max(max(map(len, strings)), minwidth)
+        fmt = {_padleft: "{0:>%ds}",
+               _padboth: "{0:^%ds}",
+               _padright: "{0:<%ds}"}[padfn] % maxwidth
+        return [fmt.format(s) for s in strings]
     s_lens = list(map(len, strings))
     s_widths = list(map(width_fn, strings))
     maxwidth = max(max(s_widths), minwidth)
-    if not enable_widechars and not has_invisible:
-        padded_strings = [padfn(maxwidth, s) for s in strings]
-    else:
-        # enable wide-character width corrections
-        visible_widths = [maxwidth - (w - l) for w, l in zip(s_widths, s_lens)]
-        # wcswidth and _visible_width don't count invisible characters;
-        # padfn doesn't need to apply another correction
-        padded_strings = [padfn(w, s) for s, w in zip(strings, visible_widths)]
+    # enable wide-character width corrections
+    visible_widths = [maxwidth - (w - l) for w, l in zip(s_widths, s_lens)]
+    # wcswidth and _visible_width don't count invisible characters;
+    # padfn doesn't need to apply another correction
+    padded_strings = [padfn(w, s) for s, w in zip(strings, visible_widths)]
     return padded_strings
 
 
@@ -650,6 +685,14 @@ def _format(val, valtype, floatfmt, missingval="", has_invisible=True):
         return "{0}".format(val)
 
 
+def _format_column(values, valtype, floatfmt, missingval=""):
+    """Format all values of a column with a known type, see _format()."""
+    if valtype is float:
+        return [missingval if v is None else format(float(v), floatfmt)
+                for v in values]
+    return [_format(v, valtype, floatfmt, missingval, False) for v in values]
+
+
 def _align_header(header, alignment, width, visible_width):
     "Pad string header to width chars given known visible_width of the header."
     width += len(header) - visible_width
@@ -845,7 +888,8 @@ def _normalize_tabular_data(tabular_data, headers, showindex="default"):
 
 def tabulate(tabular_data, headers=(), tablefmt="simple",
              floatfmt="g", numalign="decimal", stralign="left",
-             missingval="", showindex="default", disable_numparse=False):
+             missingval="", showindex="default", disable_numparse=False,
+             coltypes=None):
     """Format a fixed width table for pretty printing.
 
     >>> print(tabulate([[1, 2.34], [-56, "8.999"], ["2", "10001"]]))
@@ -1107,6 +1151,22 @@ def tabulate(tabular_data, headers=(), tablefmt="simple",
     indices is used to disable number parsing only on those columns
     e.g. `disable_numparse=[0, 2]` would disable number parsing only on the
     first and third columns.
+
+    Column types
+    ------------
+    Detecting the column types parses every value. When the types are
+    already known they can be given with `coltypes`, a list holding one
+    type (int, float or str) per column. The detection is then skipped
+    for these columns; `None` entries are still detected. Values of typed
+    columns must not contain ANSI color codes, as only the headers and
+    the untyped columns are searched for them.
+
+    >>> print(tabulate([["spam", 1, 2.5], ["eggs", 42, 3.14]],
+    ...                coltypes=[str, int, float]))
+    ----  --  ----
+    spam   1  2.5
+    eggs  42  3.14
+    ----  --  ----
     """
     if tabular_data is None:
         tabular_data = []
@@ -1118,10 +1178,36 @@ def tabulate(tabular_data, headers=(), tablefmt="simple",
     if tablefmt == 'rst':
         list_of_lists, headers = _rst_escape_first_column(list_of_lists, headers)
 
+    headers, rows, minwidths, aligns = _layout_table(
+            list_of_lists, headers, floatfmt, numalign, stralign, missingval,
+            disable_numparse, coltypes)
+
+    if not isinstance(tablefmt, TableFormat):
+        tablefmt = _table_formats.get(tablefmt, _table_formats["simple"])
+
+    return _format_table(tablefmt, headers, rows, minwidths, aligns)
+
+
+def _layout_table(list_of_lists, headers, floatfmt, numalign, stralign,
+                  missingval, disable_numparse, coltypes, colwidths=None,
+                  coldecimals=None):
+    """Format and align the cells and headers of a normalized table.
+
+    Returns the aligned headers and rows, the column widths and the column
+    alignments. Columns are at least as wide as the given `colwidths` and
+    decimal aligned columns are aligned to the given `coldecimals`."""
+    cols = list(izip_longest(*list_of_lists))
+
     # optimization: look for ANSI control codes once,
     # enable smart width functions only if a control code is found
-    plain_text = '\n'.join(['\t'.join(map(_text_type, headers))] + \
-                            ['\t'.join(map(_text_type, row)) for row in list_of_lists])
+    if coltypes is None:
+        plain_text = '\n'.join(['\t'.join(map(_text_type, headers))] + \
+                                ['\t'.join(map(_text_type, row)) for row in list_of_lists])
+    else:
+        # Typed columns are free of control codes
+        untyped = [c for c, ct in zip(cols, coltypes) if ct is None]
+        plain_text = '\n'.join(['\t'.join(map(_text_type, headers))] + \
+                                ['\t'.join(map(_text_type, c)) for c in untyped])
 
     has_invisible = re.search(_invisible_codes, plain_text)
     enable_widechars = wcwidth is not None and WIDE_CHARS_MODE
@@ -1133,16 +1219,21 @@ def tabulate(tabular_data, headers=(), tablefmt="simple",
         width_fn = len
 
     # format rows and columns, convert numeric values to strings
-    cols = list(izip_longest(*list_of_lists))
     numparses = _expand_numparse(disable_numparse, len(cols))
-    coltypes = [_column_type(col, numparse=np) for col, np in
-                zip(cols, numparses)]
+    if coltypes is None:
+        coltypes = [None] * len(cols)
+    typed = [ct is not None for ct in coltypes]
+    coltypes_ = [ct if ct is not None else _column_type(col, numparse=np)
+                 for col, np, ct in zip(cols, numparses, coltypes)]
     if isinstance(floatfmt, basestring): #old version
         float_formats = len(cols) * [floatfmt] # just duplicate the string to use in each column
     else: # if floatfmt is  list, tuple etc we have one per column
         float_formats = floatfmt
         if len(float_formats) != len(cols):
             raise TypeError("If floatfmt is a list, it must be exactly the same length as the number of columns")
+    if len(coltypes) != len(cols):
+        raise TypeError("If coltypes is given, it must be exactly the same length as the number of columns")
+    coltypes = coltypes_
     if isinstance(missingval, basestring):
         missing_vals = len(cols) * [missingval] 
     else:
@@ -1150,14 +1241,20 @@ def tabulate(tabular_data, headers=(), tablefmt="simple",
         if len(missing_vals) != len(cols):
             raise TypeError("If missingval is a list, it must be exactly the same length as the number of columns")
     
-    cols = [[_format(v, ct, fl_fmt, miss_v, has_invisible) for v in c]
-             for c, ct, fl_fmt, miss_v in zip(cols, coltypes, float_formats, missing_vals)]
+    cols = [_format_column(c, ct, fl_fmt, miss_v) if t else
+            [_format(v, ct, fl_fmt, miss_v, has_invisible) for v in c]
+             for c, ct, fl_fmt, miss_v, t in zip(cols, coltypes, float_formats, missing_vals, typed)]
 
     # align columns
     aligns = [numalign if ct in [int,float] else stralign for ct in coltypes]
     minwidths = [width_fn(h) + MIN_PADDING for h in headers] if headers else [0]*len(cols)
-    cols = [_align_column(c, a, minw, has_invisible)
-            for c, a, minw in zip(cols, aligns, minwidths)]
+    if colwidths is not None:
+        minwidths = [max(minw, w) for minw, w in zip(minwidths, colwidths)]
+    if coldecimals is None:
+        coldecimals = [None] * len(cols)
+    cols = [_align_column(c, a, minw, has_invisible, t, decs)
+            for c, a, minw, t, decs
+            in zip(cols, aligns, minwidths, typed, coldecimals)]
 
     if headers:
         # align headers and add headers
@@ -1171,10 +1268,80 @@ def tabulate(tabular_data, headers=(), tablefmt="simple",
         minwidths = [width_fn(c[0]) for c in cols]
         rows = list(zip(*cols))
 
-    if not isinstance(tablefmt, TableFormat):
-        tablefmt = _table_formats.get(tablefmt, _table_formats["simple"])
+    return headers, rows, minwidths, aligns
+
+
+# Fixed-point float formats, whose output grows with the magnitude of the value
+_fixed_point_floatfmt = re.compile(r"[+ -]?\d*(\.\d+)?[fF]$")
 
-    return _format_table(tablefmt, headers, rows, minwidths, aligns)
+
+def _column_layout(list_of_lists, headers, floatfmt, numalign, stralign,
+                   missingval, disable_numparse, coltypes):
+    """Types, widths and decimals of all columns, as found by _layout_table()
+    for the whole table, or None when they can't be found up front.
+
+    Then every part of the table can be laid out on its own and yields the
+    same lines as the whole table. The types of untyped columns are detected
+    on the whole column. The widths of int columns and float columns with
+    fixed-point formats follow from their smallest and largest value."""
+    cols = list(izip_longest(*list_of_lists))
+    if coltypes is None:
+        coltypes = [None] * len(cols)
+    if isinstance(floatfmt, basestring):
+        floatfmt = len(cols) * [floatfmt]
+    if isinstance(missingval, basestring):
+        missingval = len(cols) * [missingval]
+    if not (len(coltypes) == len(floatfmt) == len(missingval) == len(cols)):
+        return None
+    # Unaligned columns don't have a common width
+    if not (numalign and stralign):
+        return None
+    # Same as in _layout_table(), where only headers and untyped columns are
+    # checked for control codes.
+    untyped = [c for c, ct in zip(cols, coltypes) if ct is None]
+    plain_text = '\n'.join(['\t'.join(map(_text_type, headers))] + \
+                            ['\t'.join(map(_text_type, c)) for c in untyped])
+    if re.search(_invisible_codes, plain_text):
+        return None
+    if wcwidth is not None and WIDE_CHARS_MODE:
+        width_fn = wcwidth.wcswidth
+    else:
+        width_fn = len
+
+    numparses = _expand_numparse(disable_numparse, len(cols))
+    types = list()
+    colwidths = list()
+    coldecimals = list()
+    for col, ct, fl_fmt, miss_v, numparse in zip(cols, coltypes, floatfmt,
+                                                 missingval, numparses):
+        if ct is None:
+            ct = _column_type(col, numparse=numparse)
+        if ct not in (int, float, _text_type):
+            return None
+        kind = {int: numbers.Integral, float: numbers.Real}.get(ct)
+        fixed_width = ((ct is int)
+                       or bool(_fixed_point_floatfmt.match(fl_fmt)))
+        if (kind and fixed_width
+            and all(isinstance(v, kind) for v in col)
+            and all(math.isfinite(v) for v in col)):
+            # The formatted numbers grow with their magnitude and all have
+            # the same decimals.
+            strings = _format_column((min(col), max(col)), ct, fl_fmt)
+        else:
+            strings = _format_column(col, ct, fl_fmt, miss_v)
+        alignment = numalign if ct in (int, float) else stralign
+        if alignment == "decimal":
+            decimals = [_afterpoint_typed(s) for s in strings]
+            maxdecimals = max(decimals)
+            width = max(width_fn(s) - decs
+                        for s, decs in zip(strings, decimals)) + maxdecimals
+        else:
+            maxdecimals = None
+            width = max(width_fn(s.strip()) for s in strings)
+        types.append(ct)
+        colwidths.append(width)
+        coldecimals.append(maxdecimals)
+    return types, colwidths, coldecimals
 
 
 def _expand_numparse(disable_numparse, column_count):
@@ -1270,6 +1437,127 @@ def _format_table(fmt, headers, rows, colwidths, colaligns):
         return ""
 
 
+def column_layout(tabular_data, headers=(), floatfmt="g",
+                  numalign="decimal", stralign="left", missingval="",
+                  disable_numparse=False, coltypes=None):
+    """Types, widths and decimals of the columns of a table, to be passed
+    on to tabulate_lines(), or None when they can't be found up front.
+
+    The layout of a column only depends on its smallest and largest value
+    for ints and floats with fixed-point formats and on its distinct
+    values otherwise. So instead of the whole table `tabular_data` may be
+    a sample holding just these values, padded to rows of equal length.
+
+    >>> layout = column_layout([[1, 0.5], [100, 12.25]], ["n", "x"],
+    ...                        floatfmt=["", ".1f"], coltypes=[int, float])
+    >>> layout
+    ([<class 'int'>, <class 'float'>], [3, 4], [-1, 1])
+    """
+    rows = list(tabular_data)
+    if not rows or isinstance(headers, basestring):
+        return None
+    list_of_lists, headers = _normalize_tabular_data(rows, headers)
+    return _column_layout(list_of_lists, headers, floatfmt, numalign,
+                          stralign, missingval, disable_numparse, coltypes)
+
+
+def tabulate_lines(tabular_data, headers=(), tablefmt="simple",
+                   floatfmt="g", numalign="decimal", stralign="left",
+                   missingval="", disable_numparse=False, coltypes=None,
+                   layout=None):
+    """Yield the lines of a table, see tabulate().
+
+    `tabular_data` may be any iterable of rows, e.g. a generator, and
+    `headers` a list of column headers.
+
+    If the `layout` of the columns is given, see column_layout(), the
+    header is yielded right away and the rows are read, formatted and
+    yielded in batches of at most LINES_BATCH rows, so the output starts
+    immediately and the rows are never held at once. All values must fit
+    into the layout.
+
+    Otherwise the rows are collected first. When the layout doesn't depend
+    on the other rows, e.g. for ints, strings and floats of a known type
+    with fixed-point formats, it is found in a quick pass over the values
+    and the rows are formatted in batches as above. Otherwise the whole
+    table is formatted by tabulate() before the first line is yielded.
+    Either way the lines are the same as those of tabulate().
+
+    >>> rows = ([i, i**2] for i in (1, 10, 100))
+    >>> for line in tabulate_lines(rows, ["n", "n²"], coltypes=[int, int]):
+    ...     print(line)
+      n     n²
+    ---  -----
+      1      1
+     10    100
+    100  10000
+    """
+    if not isinstance(tablefmt, TableFormat):
+        tablefmt = _table_formats.get(tablefmt, _table_formats["simple"])
+    fmt = tablefmt
+    # Formats with lines between the rows are not streamed.
+    streamable = not (fmt.linebetweenrows or isinstance(headers, basestring))
+    if streamable and (layout is not None):
+        rows = iter(tabular_data)
+    else:
+        rows = list(tabular_data)
+        layout = None
+        if rows and streamable:
+            list_of_lists, norm_headers = _normalize_tabular_data(rows,
+                                                                  headers)
+            layout = _column_layout(list_of_lists, norm_headers, floatfmt,
+                                    numalign, stralign, missingval,
+                                    disable_numparse, coltypes)
+    if layout is None:
+        for line in tabulate(rows, headers, fmt, floatfmt, numalign,
+                             stralign, missingval,
+                             disable_numparse=disable_numparse,
+                             coltypes=coltypes).split("\n"):
+            yield line
+        return
+    coltypes, colwidths, coldecimals = layout
+
+    # The columns are as wide as their values and headers, as in
+    # _layout_table().
+    width_fn = len
+    if wcwidth is not None and WIDE_CHARS_MODE:
+        width_fn = wcwidth.wcswidth
+    headers = list(map(_text_type, headers))
+    if headers:
+        headers = [""]*(len(colwidths) - len(headers)) + headers
+        colwidths = [max(w, width_fn(h) + MIN_PADDING)
+                     for w, h in zip(colwidths, headers)]
+    aligns = [numalign if ct in (int, float) else stralign
+              for ct in coltypes]
+    hidden = fmt.with_header_hide if (headers and fmt.with_header_hide) else []
+    pad = fmt.padding
+    padded_widths = [(w + 2*pad) for w in colwidths]
+
+    if fmt.lineabove and "lineabove" not in hidden:
+        yield _build_line(padded_widths, aligns, fmt.lineabove)
+    if headers:
+        aligned_headers = [_align_header(h, a, w, width_fn(h))
+                           for h, a, w in zip(headers, aligns, colwidths)]
+        yield _build_row(_pad_row(aligned_headers, pad), padded_widths,
+                         aligns, fmt.headerrow)
+        if fmt.linebelowheader and "linebelowheader" not in hidden:
+            yield _build_line(padded_widths, aligns, fmt.linebelowheader)
+    rows = iter(rows)
+    while True:
+        batch = list(map(list, islice(rows, LINES_BATCH)))
+        if not batch:
+            break
+        _, batch, _, _ = _layout_table(batch, headers, floatfmt, numalign,
+                                       stralign, missingval,
+                                       disable_numparse, coltypes,
+                                       colwidths, coldecimals)
+        for row in batch:
+            yield _build_row(_pad_row(row, pad), padded_widths, aligns,
+                             fmt.datarow)
+    if fmt.linebelow and "linebelow" not in hidden:
+        yield _build_line(padded_widths, aligns, fmt.linebelow)
+
+
 def _main():
     """\
     Usage: tabulate [options] [FILE ...]
@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+
+from pathlib import Path
+
+from td.main import parse_args, parse_log
+
+LOG_DIR = Path(__file__).parent / "logs"
+
+
+def test_cache_hit_repeats_parser_messages(tmp_path, monkeypatch, capsys,
+                                           caplog):
+    monkeypatch.setenv("TD_CACHE_DIR", str(tmp_path))
+    fn = str(LOG_DIR / "ricc2c.out")
+    args = parse_args([fn, ])
+    outputs = list()
+    for _ in range(2):
+        caplog.clear()
+        parsed = parse_log(args, fn)
+        outputs.append((capsys.readouterr().out, caplog.messages))
+    # The second run loads the cached result
+    assert len(list(tmp_path.glob("*.pickle"))) == 1
+    out, log_messages = outputs[0]
+    assert "State 1 shifted by +0.10 eV" in out
+    assert "Using COSMO energies!" in log_messages
+    assert outputs[1] == outputs[0]
+    assert len(parsed["excited_states"]) == 6
@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+
+from pathlib import Path
+
+import pytest
+
+from td.export import TABLE_FLOATFMT, TABLE_HEADERS, table_lines
+from td.main import parse_args, parse_log
+from td.tabulate import tabulate
+
+LOG_DIR = Path(__file__).parent / "logs"
+
+
+@pytest.mark.parametrize("log", ["g.log", "ricc2c.out", "orca_soc.out"])
+def test_table_lines_match_tabulate(tmp_path, monkeypatch, log):
+    monkeypatch.setenv("TD_CACHE_DIR", str(tmp_path))
+    fn = str(LOG_DIR / log)
+    excited_states = parse_log(parse_args([fn, ]), fn)["excited_states"]
+    ref = tabulate([es.as_list() for es in excited_states],
+                   headers=TABLE_HEADERS, floatfmt=TABLE_FLOATFMT)
+    assert "\n".join(table_lines(excited_states)) == ref
+
+
+def test_table_lines_without_states():
+    lines = list(table_lines([]))
+    assert len(lines) == 2
+    assert lines[0].split() == ["#", "org.", "#", "sort.", "2S+1", "Spat.",
+                                "dE", "in", "eV", "l", "in", "nm", "f",
+                                "<S**2>"]
@@ -0,0 +1,19 @@
+#!/usr/bin/env python3
+
+import subprocess
+import sys
+
+# Only needed for plotting, exporting or optional parsing steps and imported
+# where they are used.
+LAZY_MODULES = ("matplotlib", "pandas", "yaml", "simplejson", "jinja2",
+                "docx", "pyparsing", "scipy")
+
+
+def test_main_import_skips_optional_dependencies():
+    code = ("import sys; import td.main; "
+            "print(' '.join(sorted(sys.modules)))")
+    out = subprocess.run([sys.executable, "-c", code], check=True,
+                         stdout=subprocess.PIPE, universal_newlines=True,
+                         ).stdout
+    loaded = {mod.split(".")[0] for mod in out.split()}
+    assert not loaded & set(LAZY_MODULES)
@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+
+from pathlib import Path
+
+from td.ExcitedStateTable import ExcitedStateTable
+from td.MOIndex import MOIndex
+from td.parser.gaussian import parse_tddft
+
+LOG_DIR = Path(__file__).parent / "logs"
+
+
+def test_mo_index_matches_state_scan():
+    excited_states = parse_tddft((LOG_DIR / "g.log").read_bytes())
+    table = ExcitedStateTable.from_excited_states(excited_states)
+    mo_index = MOIndex.from_table(table)
+
+    def scan(cond):
+        return {i for i, es in enumerate(excited_states)
+                if any(cond(mot) for mot in es.mo_transitions)}
+
+    mos = {mo for es in excited_states for mot in es.mo_transitions
+           for mo in (mot.start_mo, mot.final_mo)}
+    for mo in mos | {0, }:
+        assert (set(mo_index.from_mo(mo).tolist())
+                == scan(lambda mot: mot.start_mo == mo))
+        assert (set(mo_index.to_mo(mo).tolist())
+                == scan(lambda mot: mot.final_mo == mo))
+        for final_mo in mos:
+            assert (set(mo_index.with_pair(mo, final_mo).tolist())
+                    == scan(lambda mot: (mot.start_mo, mot.final_mo)
+                            == (mo, final_mo)))
+    mask = mo_index.mask(mo_index.from_mos([43, 42]))
+    assert mask.sum() == len(scan(lambda mot: mot.start_mo in (42, 43)))
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+
+import math
+import random
+
+import pytest
+
+from td.ExcitedState import ExcitedState
+
+CI_COEFF_THRESH = 0.2
+
+
+def loop_process(es, thresh):
+    """Quadratic calculate_contributions(), correct_backexcitations(),
+    suppress_low_ci_coeffs() and update_irreps() sequence, as ExcitedState
+    did before process_mo_transitions(). Also timed by
+    benchmarks/bench_mo_transitions.py."""
+    for mo_trans in es.mo_transitions:
+        if (mo_trans.contrib is not None and
+            not math.isclose(mo_trans.contrib, 0.0)):
+            continue
+        contrib = mo_trans.ci_coeff**2
+        if es.is_singlet():
+            contrib *= 2
+        mo_trans.contrib = contrib
+
+    back_transitions = [bt for bt in es.mo_transitions
+                        if bt.to_or_from == "<-"]
+    for bt in back_transitions:
+        trans_to_correct = [t for t in es.mo_transitions
+                            if (t.start_mo == bt.start_mo and
+                                t.final_mo == bt.final_mo and
+                                t.to_or_from == "->")]
+        if trans_to_correct:
+            assert(len(trans_to_correct) == 1)
+            trans_to_correct[0].contrib -= bt.contrib
+
+    contrib_thresh = thresh**2 * 2
+    to_del = list()
+    for mo_trans in es.mo_transitions:
+        if mo_trans.contrib:
+            if mo_trans.contrib <= contrib_thresh:
+                to_del.append(mo_trans)
+            continue
+        if abs(mo_trans.ci_coeff) <= thresh:
+            to_del.append(mo_trans)
+    for td in to_del:
+        es.mo_transitions.remove(td)
+
+    start_irreps = [mo_trans.start_irrep for mo_trans in es.mo_transitions]
+    final_irreps = [mo_trans.final_irrep for mo_trans in es.mo_transitions]
+    es.irreps = set(start_irreps + final_irreps)
+    es.mo_trans_per_irrep = dict()
+    for irrep in es.irreps:
+        start_mos = [mot.start_mo for mot in es.mo_transitions
+                     if mot.start_irrep == irrep]
+        final_mos = [mot.final_mo for mot in es.mo_transitions
+                     if mot.final_irrep == irrep]
+        es.mo_trans_per_irrep[irrep] = set(start_mos + final_mos)
+
+
+def make_states(states, trans, mult=1, mos=20, seed=0):
+    """Synthetic states with 'trans' transitions from the first 'mos' MOs
+    to the next 'mos' MOs and some back-excitations. Also used by
+    benchmarks/bench_mo_transitions.py."""
+    rnd = random.Random(seed)
+    excited_states = list()
+    for i in range(states):
+        es = ExcitedState(i+1, "Singlet", "A", 3.0, 413.3, 0.1, 0.0,
+                          mult=mult)
+        pairs = rnd.sample([(start_mo, final_mo)
+                            for start_mo in range(1, mos+1)
+                            for final_mo in range(mos+1, 2*mos+1)], trans)
+        for start_mo, final_mo in pairs:
+            irrep = rnd.choice(("a1", "a2", "b1", "b2"))
+            # Some transitions carry their contribution, like in ORCA logs
+            contrib = rnd.choice((0.0, rnd.uniform(0, 0.5)))
+            es.add_mo_transition(start_mo, "->", final_mo,
+                                 rnd.uniform(-0.5, 0.5), contrib=contrib,
+                                 start_irrep=irrep, final_irrep=irrep)
+            if rnd.random() < 0.3:
+                es.add_mo_transition(start_mo, "<-", final_mo,
+                                     rnd.uniform(-0.1, 0.1),
+                                     start_irrep=irrep, final_irrep=irrep)
+        excited_states.append(es)
+    return excited_states
+
+
+def summary(es):
+    return ([(mot.start_mo, mot.to_or_from, mot.final_mo, mot.ci_coeff,
+              mot.contrib) for mot in es.mo_transitions],
+            es.irreps, es.mo_trans_per_irrep)
+
+
+@pytest.mark.parametrize("mult", [1, 3])
+@pytest.mark.parametrize("trans", [1, 10, 100])
+def test_process_mo_transitions_matches_loop(mult, trans):
+    ref_states = make_states(20, trans, mult=mult)
+    excited_states = make_states(20, trans, mult=mult)
+    for ref_es, es in zip(ref_states, excited_states):
+        loop_process(ref_es, CI_COEFF_THRESH)
+        es.process_mo_transitions(CI_COEFF_THRESH)
+        assert summary(es) == summary(ref_es)
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+
+from pathlib import Path
+
+import pytest
+
+from td.main import parse_args, parse_log
+from td.parser.orca import parse_tddft, parse_tddft_step
+
+LOG_DIR = Path(__file__).parent / "logs"
+
+
+@pytest.fixture
+def text():
+    # Three TDDFT calculations, each followed by a spin-orbit corrected
+    # spectrum with more rows than states. The steps differ in the
+    # wavelength of the first state.
+    return (LOG_DIR / "orca_soc.out").read_bytes()
+
+
+def test_spin_orbit_tables_are_skipped(text):
+    excited_states = parse_tddft(text)
+    assert len(excited_states) == 30
+    assert [es.l for es in excited_states[::10]] == [413.9, 414.9, 415.9]
+    assert all(len(es.mo_transitions) > 0 for es in excited_states)
+
+
+@pytest.mark.parametrize("step, l", [(1, 413.9), (2, 414.9), (3, 415.9),
+                                     (-1, 415.9), (-3, 413.9)])
+def test_step_skips_spin_orbit_tables(text, step, l):
+    excited_states = parse_tddft_step(text, step)
+    assert len(excited_states) == 10
+    assert excited_states[0].l == l
+
+
+@pytest.mark.parametrize("step, gs_energy", [(1, -154.124340036),
+                                             (2, -154.224340036),
+                                             (-1, -154.324340036)])
+def test_step_gs_energy(step, gs_energy):
+    fn = str(LOG_DIR / "orca_soc.out")
+    args = parse_args([fn, "--step", str(step), "--boltzmann", fn])
+    parsed = parse_log(args, fn)
+    assert parsed["gs_energy"] == gs_energy
+
+
+def test_missing_step_exits():
+    fn = str(LOG_DIR / "orca_soc.out")
+    with pytest.raises(SystemExit, match="Couldn't find step 4"):
+        parse_log(parse_args([fn, "--step", "4"]), fn)
+
+
+@pytest.mark.parametrize("step", [1, 2, -1])
+def test_step_ntos(step):
+    # Every calculation has NTO blocks for its 10 states
+    fn = str(LOG_DIR / "orca_soc.out")
+    args = parse_args([fn, "--step", str(step), "--ntos"])
+    parsed = parse_log(args, fn)
+    assert [state for state, _ in parsed["ntos"]] == list(range(1, 11))
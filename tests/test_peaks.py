@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+
+import numpy as np
+import pytest
+
+from td.peakdetect import peakdetect
+from td.peaks import detect_peaks
+
+
+def random_signal(rng):
+    size = rng.integers(1, 400)
+    kind = rng.integers(3)
+    if kind == 0:
+        y = rng.normal(size=size).cumsum()
+    elif kind == 1:
+        # Many ties
+        y = rng.integers(0, 4, size=size).astype(float)
+    else:
+        x = np.linspace(0, rng.uniform(1, 20), size)
+        y = np.sin(x) + rng.normal(scale=0.05, size=size)
+    return y
+
+
+@pytest.mark.parametrize("seed", range(300))
+def test_detect_peaks_matches_peakdetect(seed):
+    rng = np.random.default_rng(seed)
+    y = random_signal(rng)
+    x = np.sort(rng.uniform(0, 100, size=y.size))
+    lookahead = int(rng.integers(1, 41))
+    delta = float(rng.choice([0, 0.01, 0.1, 0.5, 2]))
+    for x_axis in (None, x):
+        ref = peakdetect(y, x_axis, lookahead=lookahead, delta=delta)
+        assert detect_peaks(y, x_axis, lookahead, delta) == ref
+
+
+def test_detect_peaks_2d_matches_rows():
+    rng = np.random.default_rng(0)
+    ys = rng.normal(size=(20, 500)).cumsum(axis=1)
+    x = np.linspace(200, 700, 500)
+    peaks = detect_peaks(ys, x, lookahead=10, delta=0.5)
+    assert peaks == [peakdetect(y, x, lookahead=10, delta=0.5) for y in ys]
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from td.ExcitedState import ExcitedState
+from td.parser.gaussian import parse_tddft
+from td.Spectrum import (Spectrum, broaden_ensemble, broaden_exact,
+                         broaden_fft, gauss_uv_band, EV2CM, FFT_CUTOFF,
+                         FFT_POINTS_PER_SIGMA, FFT_THRESHOLD, NM2EV, WIDTH)
+
+LOG_DIR = Path(__file__).parent / "logs"
+
+
+def loop_broaden(excited_states, from_nm, to_nm):
+    """Per grid point and per state loop, as Spectrum.broaden() did before
+    it was vectorized."""
+    osc_nm = np.array([(es.l, es.f) for es in excited_states])
+    x = np.arange(from_nm, to_nm, 0.5)
+    spectrum = np.array([np.sum([gauss_uv_band(l, osc, l_i)
+                                 for l_i, osc in osc_nm])
+                         for l in x])
+    return np.stack((x, spectrum, spectrum / spectrum.max()), axis=-1), osc_nm
+
+
+@pytest.fixture
+def spectrum():
+    return Spectrum("g", parse_tddft((LOG_DIR / "g.log").read_bytes()))
+
+
+@pytest.mark.parametrize("method", ["exact", "window", "auto"])
+def test_broaden_matches_loop(spectrum, method):
+    spectrum.broaden_method = method
+    ref_in_nm, ref_osc_nm = loop_broaden(spectrum.excited_states,
+                                         *spectrum.nm_range)
+    in_nm, osc_nm = spectrum.broaden(*spectrum.nm_range)
+    assert in_nm.shape == ref_in_nm.shape
+    np.testing.assert_array_equal(in_nm[:,0], ref_in_nm[:,0])
+    np.testing.assert_allclose(in_nm[:,1], ref_in_nm[:,1], rtol=1e-7,
+                               atol=1e-7 * ref_in_nm[:,1].max())
+    np.testing.assert_allclose(in_nm[:,2], ref_in_nm[:,2], rtol=1e-7,
+                               atol=1e-7)
+    np.testing.assert_allclose(osc_nm[:,0], ref_osc_nm[:,0])
+    np.testing.assert_array_equal(osc_nm[:,1], ref_osc_nm[:,1])
+
+
+def test_broadened_nm_matches_loop(spectrum):
+    ref_in_nm, _ = loop_broaden(spectrum.excited_states, *spectrum.nm_range)
+    in_nm, _ = spectrum.nm
+    np.testing.assert_allclose(in_nm[:,1], ref_in_nm[:,1], rtol=1e-7,
+                               atol=1e-7 * ref_in_nm[:,1].max())
+
+
+@pytest.mark.parametrize("line_shape", ["lorentz", "voigt"])
+def test_auto_sums_non_gaussian_bands_exactly(spectrum, monkeypatch,
+                                              line_shape):
+    spectrum.line_shape = line_shape
+    spectrum.broaden_method = "exact"
+    in_nm_exact, _ = spectrum.broaden(*spectrum.nm_range)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("Windowed broadening used!")
+    monkeypatch.setattr("td.Spectrum.broaden_windowed", fail)
+    spectrum.broaden_method = "auto"
+    in_nm, _ = spectrum.broaden(*spectrum.nm_range)
+    np.testing.assert_array_equal(in_nm, in_nm_exact)
+
+
+def test_broaden_ensemble_uses_state_widths(spectrum):
+    spectrum.line_shape = "voigt"
+    spectrum.broaden_method = "exact"
+    spectrum.width = np.linspace(0.1, 0.5, len(spectrum.excited_states))
+    grid_eV = spectrum.grid("eV")
+    ref, _ = spectrum.broaden_grid(grid_eV, "eV")
+    broadened = broaden_ensemble([spectrum, spectrum], grid_eV)
+    for ys in broadened:
+        np.testing.assert_allclose(ys, ref[:,1], rtol=1e-7,
+                                   atol=1e-7 * ref[:,1].max())
+
+
+def test_broadened_is_cached(spectrum):
+    in_nm, _ = spectrum.nm
+    assert spectrum.nm[0] is in_nm
+    spectrum.width = np.full(len(spectrum.excited_states), 0.3)
+    in_nm_wide, _ = spectrum.nm
+    assert in_nm_wide is not in_nm
+    assert spectrum.nm[0] is in_nm_wide
+    # In-place edits of the states need an explicit clear_cache()
+    for es in spectrum.excited_states:
+        es.f = 0.0
+    spectrum.clear_cache()
+    assert not spectrum.nm[0][:,1].any()
+
+
+@pytest.fixture
+def many_sticks():
+    rng = np.random.default_rng(0)
+    size = FFT_THRESHOLD + 1000
+    return rng.uniform(2.0, 6.0, size), rng.uniform(0.0, 1.0, size)
+
+
+def test_fft_error_bound(many_sticks):
+    E_i, osc = many_sticks
+    E = np.arange(1.5, 6.5, 0.01)
+    ref = broaden_exact(E, E_i, osc, WIDTH)
+    spectrum = broaden_fft(E, E_i, osc, WIDTH)
+    # Error bound from the docstring of broaden_fft()
+    A = 1.3062974e8 / (WIDTH * EV2CM)
+    h = WIDTH / FFT_POINTS_PER_SIGMA
+    bound = ((h / WIDTH)**2 / 2 * A * osc.sum()
+             + A * osc.sum() * np.exp(-FFT_CUTOFF**2))
+    assert np.abs(spectrum - ref).max() <= bound
+
+
+def test_auto_uses_fft_above_threshold(many_sticks, monkeypatch):
+    E_i, osc = many_sticks
+    excited_states = [ExcitedState(i+1, "Singlet", "A", dE, NM2EV / dE, f,
+                                   0.0)
+                      for i, (dE, f) in enumerate(zip(E_i, osc))]
+    spectrum = Spectrum("many", excited_states)
+    spectrum.broaden_method = "auto"
+    calls = list()
+
+    def fft(*args, **kwargs):
+        calls.append(args)
+        return broaden_fft(*args, **kwargs)
+    monkeypatch.setattr("td.Spectrum.broaden_fft", fft)
+    spectrum.broadened("eV")
+    assert len(calls) == 1
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+
+import itertools
+import random
+
+import pytest
+
+import td.tabulate
+from td.tabulate import column_layout, tabulate, tabulate_lines
+
+
+def random_value(rnd, kind):
+    if kind == "int":
+        return rnd.randint(-10**rnd.randint(0, 6), 10**rnd.randint(0, 6))
+    if kind == "float":
+        return rnd.uniform(-1, 1) * 10**rnd.randint(-3, 5)
+    if kind == "str":
+        return rnd.choice(["a", "Singlet", "b'", "", "xx yy"])
+    if kind == "label":
+        return rnd.choice(["1", "S", "3", "2.5"])
+    return rnd.choice([None, 1, 22])
+
+
+def test_later_batch_wider(monkeypatch):
+    monkeypatch.setattr("td.tabulate.LINES_BATCH", 2)
+    rows = [[i, i**2, float(i) / 7] for i in (1, 10, 100, 1000)]
+    kwargs = dict(headers=["n", "n²", "n/7"], floatfmt=["", "", ".3f"])
+    ref = tabulate(rows, **kwargs)
+    lines = tabulate_lines(iter(rows), **kwargs)
+    assert "\n".join(lines) == ref
+    lines = tabulate_lines(iter(rows), coltypes=[int, int, float], **kwargs)
+    assert "\n".join(lines) == ref
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_tabulate_lines_matches_tabulate(monkeypatch, seed):
+    rnd = random.Random(seed)
+    kinds = [rnd.choice(["int", "float", "str", "label", "none"])
+             for _ in range(rnd.randint(1, 4))]
+    rows = [[random_value(rnd, kind) for kind in kinds]
+            for _ in range(rnd.randint(1, 30))]
+    types = {"int": int, "float": float, "str": str}
+    coltypes = [rnd.choice([None, types.get(kind)]) for kind in kinds]
+    kwargs = dict(
+        headers=rnd.choice([[], ["h"] * len(kinds), ["header"] * len(kinds)]),
+        tablefmt=rnd.choice(["simple", "plain", "latex_booktabs", "grid"]),
+        floatfmt=[rnd.choice(["", ".2f", "8.3f", "g"]) for _ in kinds],
+        numalign=rnd.choice(["decimal", "right", "center", None]),
+        stralign=rnd.choice(["left", "right", None]),
+        missingval=rnd.choice(["", "???"]),
+        coltypes=rnd.choice([None, coltypes]),
+    )
+    ref = tabulate(rows, **kwargs)
+    monkeypatch.setattr("td.tabulate.LINES_BATCH", rnd.randint(1, 5))
+    lines = tabulate_lines(iter(rows), **kwargs)
+    assert "\n".join(lines) == ref
+    # Streamed with the layout found beforehand
+    layout_kwargs = {key: kwargs[key]
+                     for key in ("headers", "floatfmt", "numalign",
+                                 "stralign", "missingval", "coltypes")}
+    layout = column_layout(rows, **layout_kwargs)
+    lines = tabulate_lines(iter(rows), layout=layout, **kwargs)
+    assert "\n".join(lines) == ref
+
+
+def test_tabulate_lines_streams_with_layout():
+    pulled = list()
+
+    def unbounded_rows():
+        for i in itertools.count():
+            pulled.append(i)
+            yield [i, i / 7]
+
+    layout = column_layout([[0, 0.0], [10**6, 10**6 / 7]], ["n", "n/7"],
+                           floatfmt=["", ".3f"], coltypes=[int, float])
+    lines = tabulate_lines(unbounded_rows(), ["n", "n/7"],
+                           floatfmt=["", ".3f"], layout=layout)
+    assert next(lines) == "      n         n/7"
+    # The header is written before any row is read
+    assert not pulled
+    assert next(lines) == "-------  ----------"
+    assert next(lines) == "      0       0.000"
+    assert next(lines) == "      1       0.143"
+    assert len(pulled) <= td.tabulate.LINES_BATCH